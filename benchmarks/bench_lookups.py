@@ -0,0 +1,144 @@
+"""Query plans and latency of motorcycle lookups, ilike versus the lower() indexes.
+
+python -m benchmarks.bench_lookups --count 100000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from sqlalchemy import func, insert, select
+from benchmarks.bench_short_codes import SPECS
+from src import create_app
+from src.config.config import TestConfig
+from src.database import db, normalized, short_codes, Motorcycle, User
+
+BRANDS = ["Honda", "Yamaha", "Suzuki", "Kawasaki", "Ducati", "BMW", "KTM", "Triumph"]
+CATEGORIES = ["Naked", "Sport", "Touring", "Adventure", "Cruiser"]
+
+
+def populate(count, user_id):
+    table = Motorcycle.__table__
+
+    for offset in range(0, count, 10_000):
+        size = min(10_000, count - offset)
+        codes = short_codes.allocate_many(size)
+        rows = []
+
+        for i, code in zip(range(offset, offset + size), codes):
+            row = dict(SPECS)
+            row.update(
+                niv=f"JH2SC{i:012d}",
+                brand=BRANDS[i % len(BRANDS)],
+                model=f"Model {i % 500}",
+                year=1990 + i % 35,
+                category=CATEGORIES[i % len(CATEGORIES)],
+                url=f"https://www.motorcyclespecs.co.za/model/{i}.html",
+                short_url=code,
+                visits=0,
+                user_id=user_id,
+            )
+            rows.append(row)
+
+        db.session.execute(insert(table), rows)
+        db.session.commit()
+
+
+def lookups(count):
+    i = count // 2
+    niv = f"jh2sc{i:012d}"
+    url = f"https://www.MotorcycleSpecs.co.za/model/{i}.html"
+    short_url = db.session.scalar(
+        select(Motorcycle.short_url).where(Motorcycle.niv == niv.upper())
+    )
+    query = select(Motorcycle.niv)
+
+    return [
+        (
+            "niv",
+            query.where(Motorcycle.niv.ilike(niv)),
+            query.where(normalized(Motorcycle.niv, niv)),
+        ),
+        (
+            "url",
+            query.where(Motorcycle.url.ilike(url)),
+            query.where(normalized(Motorcycle.url, url)),
+        ),
+        (
+            "short_url",
+            query.where(Motorcycle.short_url.ilike(short_url)),
+            query.where(Motorcycle.short_url == short_url),
+        ),
+        (
+            "brand (first page)",
+            query.where(Motorcycle.brand.ilike("ducati"))
+            .order_by(Motorcycle.niv)
+            .limit(10),
+            query.where(normalized(Motorcycle.brand, "ducati"))
+            .order_by(Motorcycle.niv)
+            .limit(10),
+        ),
+        (
+            "category (count)",
+            select(func.count()).where(Motorcycle.category.ilike("touring")),
+            select(func.count()).where(normalized(Motorcycle.category, "touring")),
+        ),
+        (
+            "year",
+            query.where(Motorcycle.year.ilike("2001")),
+            query.where(Motorcycle.year == 2001),
+        ),
+    ]
+
+
+def plan(statement):
+    compiled = statement.compile(db.engine, compile_kwargs={"literal_binds": True})
+    rows = db.session.execute(db.text(f"EXPLAIN QUERY PLAN {compiled}")).all()
+    return "; ".join(row[-1] for row in rows)
+
+
+def latency(statement, repeat):
+    started = time.perf_counter()
+
+    for _ in range(repeat):
+        db.session.execute(statement).all()
+
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+
+    class BenchConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{path}"
+        SQLALCHEMY_ECHO = False
+
+    app = create_app(config=BenchConfig)
+
+    with app.app_context():
+        db.create_all()
+        user = User(username="bench", email="bench@test.com", password="x")
+        db.session.add(user)
+        db.session.commit()
+
+        populate(args.count, user.id)
+        db.session.execute(db.text("ANALYZE"))
+
+        print(f"{args.count} motorcycles\n")
+
+        for name, before, after in lookups(args.count):
+            before_ms = latency(before, args.repeat)
+            after_ms = latency(after, args.repeat)
+
+            print(f"{name}: {before_ms:.3f} ms -> {after_ms:.3f} ms")
+            print(f"  before: {plan(before)}")
+            print(f"  after:  {plan(after)}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Serialization cost per 1,000 motorcycles, before and after the row serializer.
+
+    python -m benchmarks.bench_serializer
+
+"before" is the hand-built dict each endpoint used to construct plus Flask's
+default JSON provider, "after" is the compiled RowSerializer plus the orjson
+provider.
+"""
+
+from datetime import datetime
+import timeit
+from flask.json.provider import DefaultJSONProvider
+from src import create_app
+from src.config.config import TestConfig
+from src.database import Motorcycle
+from src.json_provider import ORJSONProvider
+from src.serializers import motorcycles_to_dicts
+
+ROWS = 1000
+REPEAT = 20
+
+
+def legacy_to_dict(motorcycle):
+    return {
+        "niv": motorcycle.niv,
+        "brand": motorcycle.brand,
+        "model": motorcycle.model,
+        "year": motorcycle.year,
+        "category": motorcycle.category,
+        "rating": motorcycle.rating,
+        "displacement": motorcycle.displacement,
+        "power": motorcycle.power,
+        "torque": motorcycle.torque,
+        "engine_cylinders": motorcycle.engine_cylinders,
+        "engine_stroke": motorcycle.engine_stroke,
+        "gearbox": motorcycle.gearbox,
+        "bore": motorcycle.bore,
+        "stroke": motorcycle.stroke,
+        "transmission_type": motorcycle.transmission_type,
+        "front_brakes": motorcycle.front_brakes,
+        "rear_brakes": motorcycle.rear_brakes,
+        "front_suspension": motorcycle.front_suspension,
+        "rear_suspension": motorcycle.rear_suspension,
+        "front_tire": motorcycle.front_tire,
+        "rear_tire": motorcycle.rear_tire,
+        "dry_weight": motorcycle.dry_weight,
+        "wheelbase": motorcycle.wheelbase,
+        "fuel_capacity": motorcycle.fuel_capacity,
+        "fuel_system": motorcycle.fuel_system,
+        "fuel_control": motorcycle.fuel_control,
+        "seat_height": motorcycle.seat_height,
+        "cooling_system": motorcycle.cooling_system,
+        "color_options": motorcycle.color_options,
+        "url": motorcycle.url,
+        "short_url": motorcycle.short_url,
+        "visit_count": motorcycle.visits,
+        "created_at": motorcycle.created_at,
+        "updated_at": motorcycle.updated_at,
+    }
+
+
+def build_motorcycles():
+    now = datetime.now()
+
+    return [
+        Motorcycle(
+            niv=f"{i:017d}",
+            brand="Honda",
+            model="Cb500f",
+            year=2022,
+            category="Naked",
+            rating=3.3,
+            displacement=471,
+            power=46.9,
+            torque=43,
+            engine_cylinders="Twin",
+            engine_stroke="4-stroke",
+            gearbox="6-speed",
+            bore=67,
+            stroke=66.8,
+            transmission_type="Chain",
+            front_brakes="Single disc",
+            rear_brakes="Single disc",
+            front_suspension="Showa 41mm SFF-BP USD forks, pre-load adjustable",
+            rear_suspension="Prolink mono with 5 stage pre-load adjuster",
+            front_tire="120/70-ZR17",
+            rear_tire="190/50-ZR17",
+            dry_weight=192,
+            wheelbase=1410,
+            fuel_capacity=790,
+            fuel_system="Injection. PGM-FI with 34mm throttle bodies",
+            fuel_control="Double Overhead Cams/Twin Cam (DOHC)",
+            seat_height=16.7,
+            cooling_system="Liquid",
+            color_options="Grand Prix Red, Matt Axis Grey Metallic",
+            url=f"https://www.motorcyclespecs.co.za/model/Honda/{i}.html",
+            short_url=f"{i:03d}",
+            visits=i,
+            created_at=now,
+            updated_at=now,
+        )
+        for i in range(ROWS)
+    ]
+
+
+def measure(label, function):
+    best = min(timeit.repeat(function, number=1, repeat=REPEAT))
+    print(f"{label:<32} {best * 1000:8.2f} ms / {ROWS} motorcycles")
+    return best
+
+
+def main():
+    class BenchConfig(TestConfig):
+        SQLALCHEMY_ECHO = False
+
+    app = create_app(config=BenchConfig)
+    default_json = DefaultJSONProvider(app)
+    fast_json = ORJSONProvider(app)
+
+    with app.app_context():
+        motorcycles = build_motorcycles()
+
+        before_rows = measure(
+            "rows: hand-built dicts", lambda: [legacy_to_dict(m) for m in motorcycles]
+        )
+        after_rows = measure(
+            "rows: RowSerializer", lambda: motorcycles_to_dicts(motorcycles)
+        )
+
+        data = motorcycles_to_dicts(motorcycles)
+        before_json = measure(
+            "json: DefaultJSONProvider", lambda: default_json.dumps(data)
+        )
+        after_json = measure("json: ORJSONProvider", lambda: fast_json.dumps(data))
+
+        before = measure(
+            "total before",
+            lambda: default_json.response(
+                {"data": [legacy_to_dict(m) for m in motorcycles]}
+            ),
+        )
+        after = measure(
+            "total after",
+            lambda: fast_json.response({"data": motorcycles_to_dicts(motorcycles)}),
+        )
+
+    print(
+        f"\nrows {before_rows / after_rows:.1f}x, json {before_json / after_json:.1f}x, "
+        f"total {before / after:.1f}x faster"
+    )
+
+
+if __name__ == "__main__":
+    main()
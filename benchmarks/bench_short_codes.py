@@ -0,0 +1,132 @@
+"""Insert a large number of motorcycles and time short code allocation.
+
+    python -m benchmarks.bench_short_codes --count 300000
+    python -m benchmarks.bench_short_codes --count 100000 --legacy
+
+`--legacy` uses the previous strategy (random 3 character code plus one
+SELECT per attempt) for comparison. It cannot go past 238,328 rows.
+"""
+
+import argparse
+import os
+import random
+import string
+import tempfile
+import time
+from src import create_app
+from src.config.config import TestConfig
+from src.database import db, Motorcycle, User
+
+SPECS = dict(
+    brand="Honda",
+    model="Cb500f",
+    year=2022,
+    category="Naked",
+    rating=3.3,
+    displacement=471,
+    power=46.9,
+    torque=43,
+    engine_cylinders="Twin",
+    engine_stroke="4-stroke",
+    gearbox="6-speed",
+    bore=67,
+    stroke=66.8,
+    transmission_type="Chain",
+    front_brakes="Single disc",
+    rear_brakes="Single disc",
+    front_suspension="Showa 41mm SFF-BP USD forks",
+    rear_suspension="Prolink mono",
+    front_tire="120/70-ZR17",
+    rear_tire="190/50-ZR17",
+    dry_weight=192,
+    wheelbase=1410,
+    fuel_capacity=790,
+    fuel_system="Injection",
+    fuel_control="DOHC",
+    seat_height=16.7,
+    cooling_system="Liquid",
+    color_options="Grand Prix Red",
+)
+
+
+def legacy_short_url():
+    characters = string.digits + string.ascii_letters
+    probes = 0
+
+    while True:
+        probes += 1
+        code = "".join(random.choices(characters, k=3))
+
+        if Motorcycle.query.filter_by(short_url=code).first() is None:
+            return code, probes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=300_000)
+    parser.add_argument("--batch", type=int, default=5_000)
+    parser.add_argument("--legacy", action="store_true")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+
+    class BenchConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{path}"
+        SQLALCHEMY_ECHO = False
+
+    app = create_app(config=BenchConfig)
+
+    with app.app_context():
+        db.create_all()
+        user = User(username="bench", email="bench@test.com", password="x")
+        db.session.add(user)
+        db.session.commit()
+
+        probes = 0
+        started = time.perf_counter()
+
+        for offset in range(0, args.count, args.batch):
+            batch_started = time.perf_counter()
+
+            for i in range(offset, min(offset + args.batch, args.count)):
+                short_url = None
+
+                if args.legacy:
+                    short_url, attempts = legacy_short_url()
+                    probes += attempts
+
+                db.session.add(
+                    Motorcycle(
+                        niv=f"{i:017d}",
+                        url=f"https://example.com/{i}",
+                        short_url=short_url,
+                        user_id=user.id,
+                        **SPECS,
+                    )
+                )
+
+            db.session.commit()
+            elapsed = time.perf_counter() - batch_started
+            print(
+                f"{min(offset + args.batch, args.count):>9} rows  "
+                f"{args.batch / elapsed:>10.0f} rows/s"
+            )
+
+        elapsed = time.perf_counter() - started
+        lengths = db.session.execute(
+            db.select(db.func.length(Motorcycle.short_url), db.func.count()).group_by(
+                db.func.length(Motorcycle.short_url)
+            )
+        ).all()
+
+    print(
+        f"\n{args.count} motorcycles in {elapsed:.2f}s ({args.count / elapsed:.0f} rows/s)"
+    )
+    print("code lengths:", {length: count for length, count in lengths})
+
+    if args.legacy:
+        print(f"collision probes: {probes} ({probes / args.count:.2f} per row)")
+
+
+if __name__ == "__main__":
+    main()
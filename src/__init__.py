@@ -2,12 +2,23 @@ from flask import Flask, redirect, jsonify
 import os
 from src.auth import auth
 from src.motorcyles import motorcycles
-from src.database import db, Motorcycle
+from src.database import db, short_codes, Motorcycle
+from src.cache import short_url_cache, user_profile_cache
+from src.visits import visit_counter
+from src.leaderboard import leaderboard
+from src.counts import count_estimator
+from src.hashing import password_hasher
+from src.revocation import token_blocklist
+from src.ratelimit import rate_limiter
+from src.json_provider import init_json
+from src.importer import import_motorcycles
+from src.indexes import check_indexes, create_indexes
 from src.constants.http_status_code import (
+    HTTP_200_OK,
     HTTP_404_NOT_FOUND,
     HTTP_500_INTERNAL_SERVER_ERROR,
 )
-from flask_jwt_extended import JWTManager
+from flask_jwt_extended import JWTManager, jwt_required
 from flasgger import Swagger, swag_from
 from src.config.swagger import swagger_config, template
 from src.config.config import config_dict
@@ -19,26 +30,64 @@ def create_app(config=config_dict["dev"]):
     app = Flask(__name__, instance_relative_config=True)
 
     app.config.from_object(config)
+    init_json(app)
     db.app = app
     db.init_app(app)
+    short_codes.init_app(app)
+    short_url_cache.init_app(app)
+    user_profile_cache.init_app(app)
+    visit_counter.init_app(app)
+    leaderboard.init_app(app)
+    count_estimator.init_app(app)
+    password_hasher.init_app(app)
+    token_blocklist.init_app(app)
+    rate_limiter.init_app(app)
+    check_indexes(app)
 
-    JWTManager(app)
+    jwt = JWTManager(app)
+    jwt.token_in_blocklist_loader(token_blocklist.is_revoked)
     app.register_blueprint(auth)
     app.register_blueprint(motorcycles)
 
     Swagger(app, config=swagger_config, template=template)
 
+    app.cli.add_command(import_motorcycles)
+    app.cli.add_command(create_indexes)
+
     @app.get("/<short_url>")
     @swag_from("./docs/short_url.yaml")
     def redirect_to_url(short_url):
-        motorcycle = Motorcycle.query.filter(
-            Motorcycle.short_url.ilike(short_url)
-        ).first_or_404()
-
-        if motorcycle:
-            motorcycle.visits += 1
-            db.session.commit()
-            return redirect(motorcycle.url)
+        cached = short_url_cache.get(short_url)
+
+        if cached is None:
+            motorcycle = Motorcycle.query.filter(
+                Motorcycle.short_url == short_url
+            ).first_or_404()
+
+            cached = (motorcycle.niv, motorcycle.short_url, motorcycle.url)
+            short_url_cache.set(short_url, cached)
+
+        niv, _, url = cached
+        visit_counter.record(niv, short_url)
+
+        return redirect(url)
+
+    @app.get("/api/v1/metrics")
+    @jwt_required()
+    @swag_from("./docs/metrics.yaml")
+    def get_metrics():
+        return (
+            jsonify(
+                {
+                    "pid": os.getpid(),
+                    "password_hasher": password_hasher.stats(),
+                    "short_url_cache": short_url_cache.stats(),
+                    "user_profile_cache": user_profile_cache.stats(),
+                    "token_blocklist": token_blocklist.stats(),
+                }
+            ),
+            HTTP_200_OK,
+        )
 
     @app.errorhandler(HTTP_404_NOT_FOUND)
     def page_not_found(e):
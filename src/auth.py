@@ -1,24 +1,35 @@
-from flask import Blueprint, request, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Blueprint, current_app, request, jsonify
 from src.constants.http_status_code import (
     HTTP_400_BAD_REQUEST,
     HTTP_401_UNAUTHORIZED,
     HTTP_409_CONFLICT,
     HTTP_201_CREATED,
     HTTP_200_OK,
+    HTTP_503_SERVICE_UNAVAILABLE,
 )
 import validators
-from src.database import User, db
+from src.cache import user_profile_cache
+from src.database import USER_UNIQUE_FIELDS, User, conflicting_field, db
+from src.hashing import HasherBusy, password_hasher
+from src.revocation import token_blocklist
 from flask_jwt_extended import (
     jwt_required,
+    get_jwt,
     get_jwt_identity,
     create_access_token,
     create_refresh_token,
 )
 from flasgger import swag_from
+from sqlalchemy import or_, select
+from sqlalchemy.exc import IntegrityError
 
 auth = Blueprint("auth", __name__, url_prefix="/api/v1/auth")
 
+REGISTER_CONFLICTS = {
+    "email": "Email address already in use",
+    "username": "Username already in use",
+}
+
 
 @auth.post("/register")
 @swag_from("./docs/auth/register.yaml")
@@ -76,17 +87,34 @@ def register():
     if not validators.email(email):
         return jsonify({"error": "Invalid email address"}), HTTP_400_BAD_REQUEST
 
-    if User.query.filter_by(email=email).first() is not None:
-        return jsonify({"error": "Email address already in use"}), HTTP_409_CONFLICT
+    # One query for both unique fields; the password is only hashed once
+    # it has passed, and the unique constraints settle any race after it
+    taken = db.session.execute(
+        select(User.email, User.username)
+        .where(or_(User.email == email, User.username == username))
+        .limit(2)
+    ).all()
+
+    if any(row.email == email for row in taken):
+        return jsonify({"error": REGISTER_CONFLICTS["email"]}), HTTP_409_CONFLICT
 
-    if User.query.filter_by(username=username).first() is not None:
-        return jsonify({"error": "Username already in use"}), HTTP_409_CONFLICT
+    if taken:
+        return jsonify({"error": REGISTER_CONFLICTS["username"]}), HTTP_409_CONFLICT
 
-    pwd_hash = generate_password_hash(password)
+    pwd_hash = password_hasher.hash(password)
 
     user = User(username=username, email=email, password=pwd_hash)
     db.session.add(user)
-    db.session.commit()
+
+    try:
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+
+        if (field := conflicting_field(e, USER_UNIQUE_FIELDS)) is None:
+            raise
+
+        return jsonify({"error": REGISTER_CONFLICTS[field]}), HTTP_409_CONFLICT
 
     return (
         jsonify(
@@ -111,11 +139,18 @@ def login():
     user = User.query.filter_by(email=email).first()
 
     if user:
-        is_password_correct = check_password_hash(user.password, password)
+        is_password_correct = password_hasher.check(user.password, password)
 
         if is_password_correct:
+            # Stored with an older method or cost, upgrade while we know it
+            if password_hasher.needs_rehash(user.password):
+                user.password = password_hasher.hash(password)
+                db.session.commit()
+
             refresh = create_refresh_token(identity=user.id)
-            access = create_access_token(identity=user.id)
+            access = create_access_token(
+                identity=user.id, additional_claims=profile_claims(user.id)
+            )
 
             return (
                 jsonify(
@@ -142,28 +177,71 @@ def login():
 def me():
     user_id = get_jwt_identity()
 
-    user = User.query.filter_by(id=user_id).first()
+    # Tokens issued with JWT_PROFILE_CLAIMS carry the profile themselves
+    if (profile := get_jwt().get("profile")) is None:
+        profile = user_profile(user_id)
 
     return (
         jsonify(
             {
                 "message": "User retrieved successfully",
-                "user": {
-                    "username": user.username,
-                    "email": user.email,
-                },
+                "user": profile,
             }
         ),
         HTTP_200_OK,
     )
 
 
+def user_profile(user_id):
+    profile = user_profile_cache.get(user_id)
+
+    if profile is None:
+        user = db.session.get(User, user_id)
+        profile = {"username": user.username, "email": user.email}
+        user_profile_cache.set(user_id, profile)
+
+    return profile
+
+
+def profile_claims(user_id):
+    if not current_app.config.get("JWT_PROFILE_CLAIMS", False):
+        return {}
+
+    return {"profile": user_profile(user_id)}
+
+
+@auth.post("/logout")
+@jwt_required(verify_type=False)
+@swag_from("./docs/auth/logout.yaml")
+def logout():
+    # Revokes the token sent, access or refresh; log out of both by calling
+    # this once with each
+    token = get_jwt()
+    token_blocklist.revoke(token, get_jwt_identity())
+
+    return (
+        jsonify({"message": f"{token['type'].capitalize()} token revoked"}),
+        HTTP_200_OK,
+    )
+
+
+@auth.errorhandler(HasherBusy)
+def hasher_busy(e):
+    return (
+        jsonify({"error": "Too many passwords being hashed, try again shortly"}),
+        HTTP_503_SERVICE_UNAVAILABLE,
+        {"Retry-After": "1"},
+    )
+
+
 @auth.get("/token/refresh")
 @jwt_required(refresh=True)
 @swag_from("./docs/auth/refresh_token.yaml")
 def refresh_user_token():
     identity = get_jwt_identity()
-    access = create_access_token(identity=identity)
+    access = create_access_token(
+        identity=identity, additional_claims=profile_claims(identity)
+    )
     return (
         jsonify(
             {
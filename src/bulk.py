@@ -0,0 +1,166 @@
+from itertools import islice
+import json
+from sqlalchemy import func, insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from src.constants.http_status_code import (
+    HTTP_201_CREATED,
+    HTTP_400_BAD_REQUEST,
+    HTTP_409_CONFLICT,
+)
+from src.database import Motorcycle, db, short_codes
+from src.schemas import CREATE_VALIDATOR, validate
+
+
+class InvalidItem(ValueError):
+    pass
+
+
+def parse_ndjson(lines):
+    """Yields one motorcycle per non-blank line, or an InvalidItem for bad JSON."""
+    for line in lines:
+        if not line.strip():
+            continue
+
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield InvalidItem("Invalid JSON")
+
+
+def chunked(items, size):
+    items = iter(items)
+
+    while chunk := list(islice(items, size)):
+        yield chunk
+
+
+def validate_motorcycle(item):
+    if isinstance(item, InvalidItem):
+        return str(item)
+
+    return validate(CREATE_VALIDATOR, item)
+
+
+class BulkInsert:
+    """Inserts motorcycles chunk by chunk and reports the outcome of every item.
+
+    Each chunk is validated in Python, checked for duplicates with a single
+    query on the lower(niv)/lower(url) indexes and written with one
+    executemany INSERT in its own transaction, so a failing chunk never undoes
+    the ones committed before it.
+    """
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.created = 0
+        self.failed = 0
+
+    def run(self, items, chunk_size):
+        results = []
+
+        for n, chunk in enumerate(chunked(items, chunk_size)):
+            results.extend(self.insert_chunk(chunk, n * chunk_size))
+
+        return results
+
+    def insert_chunk(self, chunk, offset=0):
+        results = [None] * len(chunk)
+        candidates = []
+        # Only duplicates within the chunk need tracking: earlier chunks are
+        # committed, so the query for existing rows already sees them
+        nivs, urls = set(), set()
+
+        for i, item in enumerate(chunk):
+            if error := validate_motorcycle(item):
+                results[i] = self._error(offset + i, item, error, HTTP_400_BAD_REQUEST)
+            elif item["niv"].lower() in nivs:
+                results[i] = self._error(
+                    offset + i, item, "NIV already exists", HTTP_409_CONFLICT
+                )
+            elif item["url"].lower() in urls:
+                results[i] = self._error(
+                    offset + i, item, "URL already exists", HTTP_409_CONFLICT
+                )
+            else:
+                nivs.add(item["niv"].lower())
+                urls.add(item["url"].lower())
+                candidates.append(i)
+
+        if not candidates:
+            return results
+
+        existing_nivs, existing_urls = self._existing(
+            [chunk[i]["niv"].lower() for i in candidates],
+            [chunk[i]["url"].lower() for i in candidates],
+        )
+        rows = []
+
+        for i in candidates:
+            item = chunk[i]
+
+            if item["niv"].lower() in existing_nivs:
+                results[i] = self._error(
+                    offset + i, item, "NIV already exists", HTTP_409_CONFLICT
+                )
+            elif item["url"].lower() in existing_urls:
+                results[i] = self._error(
+                    offset + i, item, "URL already exists", HTTP_409_CONFLICT
+                )
+            else:
+                rows.append(i)
+
+        if not rows:
+            return results
+
+        # Reserve the codes before the INSERT takes the write lock
+        codes = short_codes.allocate_many(len(rows))
+        values = [
+            {**chunk[i], "short_url": code, "user_id": self.user_id}
+            for i, code in zip(rows, codes)
+        ]
+
+        try:
+            db.session.execute(insert(Motorcycle.__table__), values)
+            db.session.commit()
+        except IntegrityError:
+            # Lost a race with another writer; nothing from this chunk is kept
+            db.session.rollback()
+
+            for i in rows:
+                results[i] = self._error(
+                    offset + i,
+                    chunk[i],
+                    "Conflicts with a motorcycle added concurrently",
+                    HTTP_409_CONFLICT,
+                )
+
+            return results
+
+        for i, row in zip(rows, values):
+            self.created += 1
+            results[i] = {
+                "index": offset + i,
+                "niv": row["niv"],
+                "status": HTTP_201_CREATED,
+                "short_url": row["short_url"],
+            }
+
+        return results
+
+    def _existing(self, nivs, urls):
+        niv_key = func.lower(Motorcycle.niv)
+        url_key = func.lower(Motorcycle.url)
+        found = db.session.execute(
+            select(niv_key, url_key).where(or_(niv_key.in_(nivs), url_key.in_(urls)))
+        ).all()
+
+        return {niv for niv, _ in found}, {url for _, url in found}
+
+    def _error(self, index, item, error, status):
+        self.failed += 1
+        result = {"index": index, "status": status, "error": error}
+
+        if isinstance(item, dict) and isinstance(item.get("niv"), str):
+            result["niv"] = item["niv"]
+
+        return result
@@ -0,0 +1,95 @@
+from collections import OrderedDict
+from threading import Lock
+import time
+
+
+class LRUCache:
+    """Bounded, thread-safe LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, expires_at = entry
+
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ShortURLCache(LRUCache):
+    """Maps a short code to the `(niv, short_url, url)` of its motorcycle."""
+
+    def init_app(self, app):
+        self.maxsize = app.config.get("SHORT_URL_CACHE_SIZE", 4096)
+        self.ttl = app.config.get("SHORT_URL_CACHE_TTL", 300)
+        self.clear()
+        app.extensions["short_url_cache"] = self
+
+
+short_url_cache = ShortURLCache()
+
+
+class UserProfileCache(LRUCache):
+    """Maps a user id to the `{"username", "email"}` profile served by /me."""
+
+    def init_app(self, app):
+        self.maxsize = app.config.get("USER_CACHE_SIZE", 1024)
+        self.ttl = app.config.get("USER_CACHE_TTL", 60)
+        self.clear()
+        app.extensions["user_profile_cache"] = self
+
+
+user_profile_cache = UserProfileCache()
@@ -0,0 +1,47 @@
+import hashlib
+from flask import after_this_request, current_app, request
+from src.constants.http_status_code import HTTP_200_OK, HTTP_304_NOT_MODIFIED
+
+
+def make_etag(*parts):
+    return hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()
+
+
+# Only ETags are used: updated_at misses deletions and visits, so a
+# Last-Modified built from it would let If-Modified-Since serve stale copies
+
+
+def conditional(etag):
+    """Answer with 304 when the client's copy is current, else tag the 200 response."""
+    response = not_modified(etag)
+
+    if response is None:
+
+        @after_this_request
+        def tag_response(response):
+            if response.status_code == HTTP_200_OK:
+                response.set_etag(etag)
+
+            return response
+
+    return response
+
+
+def not_modified(etag):
+    """Return a 304 response when the request's If-None-Match still matches."""
+    if not request.if_none_match.contains_weak(etag):
+        return None
+
+    response = current_app.response_class(status=HTTP_304_NOT_MODIFIED)
+    response.set_etag(etag)
+    return response
+
+
+def tag_content(response):
+    """ETag a response from its body and turn it into a 304 when that matches.
+
+    For pages whose validators would cost a query of their own, the body is
+    already built, so hashing it is the cheapest fingerprint there is.
+    """
+    response.add_etag()
+    return response.make_conditional(request)
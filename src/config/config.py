@@ -1,4 +1,5 @@
 import os
+import tempfile
 from decouple import config
 from datetime import timedelta
 
@@ -14,6 +15,66 @@ class Config:
     SECRET_KEY = os.environ.get("SECRET_KEY")
     JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY")
     Swagger = {"tittle": "Motorcycle API", "uiversion": 3}
+    # Serialize responses with orjson when it is installed
+    FAST_JSON = True
+    SHORT_URL_CACHE_SIZE = 4096
+    SHORT_URL_CACHE_TTL = 300
+    # Short codes reserved per database round-trip by each worker
+    SHORT_URL_BLOCK_SIZE = 500
+    SHORT_URL_LENGTH = 3
+    # Cached totals served to ?count=estimate listings
+    COUNT_ESTIMATE_TTL = 60
+    COUNT_ESTIMATE_SIZE = 1024
+    # Buffer redirect visits in memory and write them in batches
+    VISITS_BUFFERED = True
+    VISITS_FLUSH_INTERVAL = 5
+    VISITS_FLUSH_THRESHOLD = 1000
+    # Most visited motorcycles served by /trending, out of a larger set of
+    # candidates whose counts are reloaded from the database periodically
+    LEADERBOARD_SIZE = 10
+    LEADERBOARD_CANDIDATES = 100
+    LEADERBOARD_REBUILD_INTERVAL = 300
+    # Motorcycles validated and inserted per transaction by the bulk endpoint
+    BULK_CHUNK_SIZE = 500
+    # werkzeug method:cost for new password hashes; hashes stored with other
+    # parameters are upgraded on the next successful login
+    PASSWORD_HASH_METHOD = "pbkdf2:sha256:600000"
+    # Processes hashing passwords off the request thread, 0 hashes inline
+    PASSWORD_HASH_WORKERS = 2
+    PASSWORD_HASH_QUEUE_SIZE = 64
+    PASSWORD_HASH_TIMEOUT = 5
+    # Profiles served by /auth/me, dropped whenever the user row changes
+    USER_CACHE_SIZE = 1024
+    USER_CACHE_TTL = 60
+    # Embed username and email in access tokens so /auth/me skips the
+    # database; a changed profile shows up once the token is refreshed
+    JWT_PROFILE_CLAIMS = False
+    # Seconds before a token revoked by another worker is rejected here too
+    REVOCATION_SYNC_INTERVAL = 10
+    # How far each sync reads back, for revocations committed out of order
+    REVOCATION_SYNC_OVERLAP = 60
+    REVOCATION_REBUILD_INTERVAL = 3600
+    # 2**20 bits hold ~100k revoked tokens at a 1% false positive rate
+    REVOCATION_BLOOM_SIZE = 1 << 20
+    REVOCATION_BLOOM_HASHES = 7
+    # Token buckets per endpoint or blueprint as (burst, requests refilled
+    # per second), kept in one SQLite file so every worker on the host
+    # shares them
+    RATELIMIT_ENABLED = True
+    RATELIMIT_STORAGE = os.environ.get(
+        "RATELIMIT_STORAGE",
+        os.path.join(tempfile.gettempdir(), "motorcycle-api-ratelimit.sqlite3"),
+    )
+    RATELIMIT_POLICIES = {
+        # Password guessing is limited hard; registration leaves room for
+        # provisioning accounts in bulk
+        "auth.login": (10, 10 / 60),
+        "auth.register": (60, 1),
+        "auth": (120, 2),
+        "motorcycles": (120, 2),
+    }
+    # Endpoints that don't check the token, so it can't identify the client
+    RATELIMIT_BY_IP = ("auth.login", "auth.register")
 
 
 class DevConfig(Config):
@@ -30,6 +91,10 @@ class TestConfig(Config):
     SQLALCHEMY_ECHO = True
     SECRET_KEY = "TestSecretKey"
     JWT_SECRET_KEY = "TestJWTSecretKey"
+    VISITS_BUFFERED = False
+    PASSWORD_HASH_METHOD = "pbkdf2:sha256:1000"
+    PASSWORD_HASH_WORKERS = 0
+    RATELIMIT_ENABLED = False
 
 
 class ProdConfig(Config):
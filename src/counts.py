@@ -0,0 +1,84 @@
+from threading import Lock, Thread
+import time
+from sqlalchemy import func, select
+from src.database import db
+
+
+class CountEstimator:
+    """Caches row counts per search filter and refreshes stale ones in the background.
+
+    A filter seen for the first time is counted inline. Afterwards the cached
+    total is returned straight away and, once it is older than `ttl` seconds,
+    recounted on a background thread so no request waits on the COUNT query.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.ttl = 60
+        self.maxsize = 1024
+        self._counts = {}
+        self._refreshing = set()
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.ttl = app.config.get("COUNT_ESTIMATE_TTL", 60)
+        self.maxsize = app.config.get("COUNT_ESTIMATE_SIZE", 1024)
+        self.clear()
+        app.extensions["count_estimator"] = self
+
+    def estimate(self, key, query):
+        with self._lock:
+            entry = self._counts.get(key)
+
+        statement = select(func.count()).select_from(query.order_by(None).subquery())
+
+        if entry is None:
+            return self.refresh(key, statement)
+
+        total, refreshed_at = entry
+
+        if time.monotonic() - refreshed_at >= self.ttl:
+            with self._lock:
+                stale = key not in self._refreshing
+                self._refreshing.add(key)
+
+            if stale:
+                Thread(
+                    target=self._refresh_in_background,
+                    args=(key, statement),
+                    daemon=True,
+                ).start()
+
+        return total
+
+    def refresh(self, key, statement):
+        total = db.session.scalar(statement)
+
+        with self._lock:
+            self._counts.pop(key, None)
+            self._counts[key] = (total, time.monotonic())
+
+            # Forget the least recently counted filters first
+            while len(self._counts) > self.maxsize:
+                del self._counts[next(iter(self._counts))]
+
+        return total
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+            self._refreshing.clear()
+
+    def _refresh_in_background(self, key, statement):
+        try:
+            with self.app.app_context():
+                self.refresh(key, statement)
+        except Exception:
+            self.app.logger.exception("Failed to refresh count estimate")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+
+count_estimator = CountEstimator()
@@ -1,11 +1,13 @@
 from enum import unique
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-import string
+from sqlalchemy import event, func
 from sqlalchemy.orm import backref
-import random
+from src.cache import user_profile_cache
+from src.shortcodes import ShortCodeAllocator
 
 db = SQLAlchemy()
+short_codes = ShortCodeAllocator(db)
 
 
 class User(db.Model):
@@ -13,8 +15,8 @@ class User(db.Model):
     username = db.Column(db.String(80), nullable=False, unique=True)
     email = db.Column(db.String(120), nullable=False, unique=True)
     password = db.Column(db.Text, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.now())
-    updated_at = db.Column(db.DateTime, default=datetime.now())
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.now)
     # bookmarks = db.relationship("Bookmark", backref="user")
     motorcycles = db.relationship("Motorcycle", backref="user")
 
@@ -22,7 +24,36 @@ class User(db.Model):
         return f"User>>> {self.username}"
 
 
+# Fired on flush for changes made through the ORM; a profile cached again
+# before the commit lands is stale for at most USER_CACHE_TTL seconds
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def forget_user_profile(mapper, connection, user):
+    user_profile_cache.invalidate(user.id)
+
+
 class Motorcycle(db.Model):
+    # (column, niv) indexes back the range filters and sort= on spec columns
+    __table_args__ = tuple(
+        db.Index(f"ix_motorcycle_{column}_niv", column, "niv")
+        for column in [
+            "year",
+            "power",
+            "displacement",
+            "torque",
+            "dry_weight",
+            "seat_height",
+            "rating",
+            "fuel_capacity",
+        ]
+    ) + (
+        # Serve /stats for one owner, in niv or visits order, from the index
+        db.Index("ix_motorcycle_user_id_niv", "user_id", "niv"),
+        db.Index("ix_motorcycle_user_id_visits", "user_id", "visits", "niv"),
+        # Read backwards to rebuild the most visited leaderboard
+        db.Index("ix_motorcycle_visits_niv", "visits", "niv"),
+    )
+
     niv = db.Column(db.String(17), primary_key=True)
     brand = db.Column(db.String(50), nullable=False)
     model = db.Column(db.String(50), nullable=False)
@@ -40,8 +71,8 @@ class Motorcycle(db.Model):
     transmission_type = db.Column(db.String(50), nullable=False)
     front_brakes = db.Column(db.String(50), nullable=False)
     rear_brakes = db.Column(db.String(50), nullable=False)
-    front_suspension = db.Column(db.String(50), nullable=False)
-    rear_suspension = db.Column(db.String(50), nullable=False)
+    front_suspension = db.Column(db.String(200), nullable=False)
+    rear_suspension = db.Column(db.String(200), nullable=False)
     front_tire = db.Column(db.String(50), nullable=False)
     rear_tire = db.Column(db.String(50), nullable=False)
     dry_weight = db.Column(db.Integer, nullable=False)
@@ -54,27 +85,96 @@ class Motorcycle(db.Model):
     color_options = db.Column(db.String(200), nullable=False)
 
     url = db.Column(db.Text, nullable=False)
-    short_url = db.Column(db.String(3), nullable=False, unique=True)
+    short_url = db.Column(db.String(8), nullable=False, unique=True)
     visits = db.Column(db.Integer, nullable=False, default=0)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
 
-    created_at = db.Column(db.DateTime(), default=datetime.now())
-    updated_at = db.Column(db.DateTime(), default=datetime.now())
+    created_at = db.Column(db.DateTime(), default=datetime.now)
+    updated_at = db.Column(db.DateTime(), default=datetime.now)
 
     def generate_short_url(self):
-        characters = string.digits + string.ascii_letters
-        piked_chars = "".join(random.choices(characters, k=3))
-
-        link = self.query.filter_by(short_url=piked_chars).first()
-
-        if link:
-            self.generate_short_url()
-        else:
-            return piked_chars
+        return short_codes.allocate()
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.short_url = self.generate_short_url()
+
+        if self.short_url is None:
+            self.short_url = self.generate_short_url()
 
     def __repr__(self):
         return f"Motorcycle>>> {self.brand} {self.model} {self.year}"
+
+
+# Case-insensitive lookups compare lower(column) against these expression
+# indexes instead of running ilike, which no B-tree index can serve.
+db.Index("ix_motorcycle_niv_lower", func.lower(Motorcycle.niv), unique=True)
+db.Index("ix_motorcycle_url_lower", func.lower(Motorcycle.url), unique=True)
+db.Index("ix_motorcycle_brand_lower", func.lower(Motorcycle.brand), Motorcycle.niv)
+db.Index("ix_motorcycle_model_lower", func.lower(Motorcycle.model), Motorcycle.niv)
+db.Index(
+    "ix_motorcycle_category_lower", func.lower(Motorcycle.category), Motorcycle.niv
+)
+
+
+def normalized(column, value):
+    return func.lower(column) == func.lower(value)
+
+
+# Unique constraints and indexes of motorcycle -> the field they keep unique.
+# PostgreSQL reports the constraint name, SQLite the index or table.column.
+UNIQUE_FIELDS = {
+    "ix_motorcycle_niv_lower": "niv",
+    "ix_motorcycle_url_lower": "url",
+    "motorcycle_pkey": "niv",
+    "motorcycle.niv": "niv",
+    "motorcycle_short_url_key": "short_url",
+    "motorcycle.short_url": "short_url",
+}
+
+
+USER_UNIQUE_FIELDS = {
+    "user_email_key": "email",
+    "user.email": "email",
+    "user_username_key": "username",
+    "user.username": "username",
+}
+
+
+def conflicting_field(error, unique_fields=UNIQUE_FIELDS):
+    """Return the field an IntegrityError found a duplicate of."""
+    diag = getattr(error.orig, "diag", None)
+
+    if name := getattr(diag, "constraint_name", None):
+        return unique_fields.get(name)
+
+    message = str(error.orig)
+
+    return next(
+        (field for name, field in unique_fields.items() if name in message), None
+    )
+
+
+class ShortCodeSequence(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    length = db.Column(db.Integer, nullable=False)
+    next_value = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class RevokedToken(db.Model):
+    jti = db.Column(db.String(36), primary_key=True)
+    user_id = db.Column(db.Integer, nullable=True)
+    token_type = db.Column(db.String(10), nullable=False)
+    # Workers pull new revocations incrementally by this column, so it is
+    # set by the database clock rather than by whichever host revoked
+    revoked_at = db.Column(db.DateTime, nullable=False, default=func.now(), index=True)
+    # Past this the token is rejected anyway, so the row can be dropped
+    expires_at = db.Column(db.DateTime, nullable=True)
+
+
+class VisitBucket(db.Model):
+    # Visits to a short URL in the hour or day (UTC) beginning at `start`;
+    # the key order serves range queries for one short URL and granularity
+    short_url = db.Column(db.String(8), primary_key=True)
+    granularity = db.Column(db.String(4), primary_key=True)
+    start = db.Column(db.DateTime, primary_key=True)
+    visits = db.Column(db.Integer, nullable=False, default=0)
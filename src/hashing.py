@@ -0,0 +1,139 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_all_start_methods, get_context
+from threading import BoundedSemaphore, Lock
+import atexit
+import time
+from werkzeug.security import check_password_hash, generate_password_hash
+from src.timing import record_timing
+
+# Forking a threaded server copies locks that other threads may hold, so
+# workers are started from a clean process instead
+START_METHOD = "forkserver" if "forkserver" in get_all_start_methods() else "spawn"
+
+
+class HasherBusy(RuntimeError):
+    pass
+
+
+class PasswordHasher:
+    """Hashes and checks passwords on a bounded pool of worker processes.
+
+    Key stretching is pure CPU work that holds the GIL, so running it inline
+    stalls every other request served by the process. With `workers` set the
+    work goes to a process pool instead; at most `queue_size` calls may be
+    queued or running at once and callers beyond that wait up to `timeout`
+    seconds before HasherBusy is raised. `workers = 0` hashes inline. If a
+    worker dies the pool is replaced and the call retried once.
+    """
+
+    def __init__(self):
+        self.method = "pbkdf2:sha256:600000"
+        self.workers = 0
+        self.timeout = 5
+        self._prefix = None
+        self._slots = BoundedSemaphore(64)
+        self._pool = None
+        self._lock = Lock()
+        self._reset_stats()
+        atexit.register(self.shutdown)
+
+    def init_app(self, app):
+        self.shutdown()
+
+        self.method = app.config.get("PASSWORD_HASH_METHOD", "pbkdf2:sha256:600000")
+        self.workers = app.config.get("PASSWORD_HASH_WORKERS", 0)
+        self.timeout = app.config.get("PASSWORD_HASH_TIMEOUT", 5)
+        self._slots = BoundedSemaphore(app.config.get("PASSWORD_HASH_QUEUE_SIZE", 64))
+        # werkzeug fills in defaults, e.g. "pbkdf2" is stored as
+        # "pbkdf2:sha256:600000", so compare against what it actually writes
+        self._prefix = generate_password_hash("", self.method).split("$", 1)[0]
+        self._reset_stats()
+        app.extensions["password_hasher"] = self
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def check(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        return pwhash.split("$", 1)[0] != self._prefix
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_depth": self._depth,
+                "calls": self._calls,
+                "avg_ms": self._total / self._calls * 1000 if self._calls else 0.0,
+                "max_ms": self._max * 1000,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    def _run(self, function, *args):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise HasherBusy()
+
+        started = time.perf_counter()
+
+        with self._lock:
+            self._depth += 1
+
+        try:
+            if not self.workers:
+                return function(*args)
+
+            pool = self._executor()
+
+            try:
+                return pool.submit(function, *args).result()
+            except BrokenProcessPool:
+                # A worker was killed (OOM, signal); the pool can't be reused
+                self._discard(pool)
+                return self._executor().submit(function, *args).result()
+        finally:
+            elapsed = time.perf_counter() - started
+
+            with self._lock:
+                self._depth -= 1
+                self._calls += 1
+                self._total += elapsed
+                self._max = max(self._max, elapsed)
+
+            self._slots.release()
+            record_timing("hash", elapsed)
+
+    def _executor(self):
+        # Started on first use, so forked server workers each get their own
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=get_context(START_METHOD)
+                )
+
+            return self._pool
+
+    def _discard(self, pool):
+        # Concurrent callers may all see the same broken pool; replace it once
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _reset_stats(self):
+        with self._lock:
+            self._depth = 0
+            self._calls = 0
+            self._total = 0.0
+            self._max = 0.0
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,164 @@
+import csv
+import json
+import math
+import os
+import time
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from src.bulk import BulkInsert, InvalidItem, chunked, parse_ndjson
+from src.database import Motorcycle, User
+from src.schemas import MOTORCYCLE_PARAMETERS, SERVER_COLUMNS, json_type
+
+# Columns of an /export dump that are assigned again on import
+IGNORED_COLUMNS = set(SERVER_COLUMNS) | {"visit_count"}
+
+COLUMN_TYPES = {
+    key: json_type(Motorcycle.__table__.c[key]) for key in MOTORCYCLE_PARAMETERS
+}
+
+
+def coerce(value, column_type):
+    # CSV cells are strings; anything that doesn't parse is left to validation
+    if column_type == "string":
+        return value
+
+    try:
+        number = float(value)
+    except ValueError:
+        return value
+
+    if not math.isfinite(number):
+        return value
+
+    if column_type == "integer":
+        return int(number) if number.is_integer() else value
+
+    return number
+
+
+def read_csv(handle, offset):
+    header = next(csv.reader([handle.readline().decode("utf-8-sig")]))
+    header = [name.strip() for name in header]
+
+    for name in header:
+        if name not in MOTORCYCLE_PARAMETERS and name not in IGNORED_COLUMNS:
+            raise click.ClickException(f"Unknown column - {name}")
+
+    if offset:
+        handle.seek(offset)
+
+    # csv reads a record's lines lazily, so handle.tell() stays on a record
+    # boundary between chunks and can be saved as the checkpoint
+    for values in csv.reader(line.decode("utf-8") for line in handle):
+        if len(values) != len(header):
+            yield InvalidItem("Wrong number of columns")
+            continue
+
+        yield {
+            name: coerce(value, COLUMN_TYPES[name])
+            for name, value in zip(header, values)
+            if name not in IGNORED_COLUMNS
+        }
+
+
+def read_ndjson(handle, offset):
+    handle.seek(offset)
+
+    for item in parse_ndjson(handle):
+        if isinstance(item, dict):
+            item = {k: v for k, v in item.items() if k not in IGNORED_COLUMNS}
+
+        yield item
+
+
+READERS = {"csv": read_csv, "ndjson": read_ndjson}
+
+
+def load_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"offset": 0, "rows": 0, "created": 0, "failed": 0}
+
+
+def save_checkpoint(path, checkpoint):
+    # Written to a temporary file first so a crash never leaves half of it
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(checkpoint, f)
+
+    os.replace(f"{path}.tmp", path)
+
+
+@click.command("import-motorcycles")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--user", "username", required=True, help="Owner of the new rows.")
+@click.option("--format", "file_format", type=click.Choice(list(READERS)))
+@click.option("--chunk-size", type=click.IntRange(min=1))
+@click.option("--checkpoint", "checkpoint_path", type=click.Path(dir_okay=False))
+@click.option("--restart", is_flag=True, help="Ignore an existing checkpoint.")
+@with_appcontext
+def import_motorcycles(
+    path, username, file_format, chunk_size, checkpoint_path, restart
+):
+    """Import motorcycles from a CSV or NDJSON file.
+
+    Rows are streamed from PATH and inserted in chunks, each in its own
+    transaction. After every chunk the position in the file is saved to a
+    checkpoint, so a failed import picks up where it stopped when run again.
+    """
+    user = User.query.filter_by(username=username).first()
+
+    if user is None:
+        raise click.ClickException(f"User {username} not found")
+
+    file_format = file_format or ("csv" if path.endswith(".csv") else "ndjson")
+    chunk_size = chunk_size or current_app.config.get("BULK_CHUNK_SIZE", 500)
+    checkpoint_path = checkpoint_path or f"{path}.checkpoint"
+
+    if restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    checkpoint = load_checkpoint(checkpoint_path)
+
+    if checkpoint["rows"]:
+        click.echo(f"Resuming after row {checkpoint['rows']}")
+
+    bulk = BulkInsert(user.id)
+    started = time.perf_counter()
+    rows = 0
+
+    with open(path, "rb") as handle:
+        items = READERS[file_format](handle, checkpoint["offset"])
+
+        for chunk in chunked(items, chunk_size):
+            results = bulk.insert_chunk(chunk, checkpoint["rows"])
+            failed = [result for result in results if "error" in result]
+
+            for result in failed:
+                click.echo(f"Row {result['index'] + 1}: {result['error']}", err=True)
+
+            rows += len(chunk)
+            checkpoint.update(
+                offset=handle.tell(),
+                rows=checkpoint["rows"] + len(chunk),
+                created=checkpoint["created"] + len(chunk) - len(failed),
+                failed=checkpoint["failed"] + len(failed),
+            )
+            save_checkpoint(checkpoint_path, checkpoint)
+
+            elapsed = time.perf_counter() - started
+            click.echo(
+                f"{checkpoint['rows']} rows, {checkpoint['created']} created, "
+                f"{checkpoint['failed']} rejected ({rows / elapsed:.0f} rows/s)"
+            )
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    elapsed = time.perf_counter() - started
+    click.echo(
+        f"Imported {checkpoint['created']} of {checkpoint['rows']} motorcycles "
+        f"in {elapsed:.1f}s ({rows / elapsed:.0f} rows/s)"
+    )
@@ -0,0 +1,76 @@
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import inspect
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from src.database import db
+
+
+def missing_indexes():
+    """Indexes declared on the models but absent from existing tables.
+
+    `create_all()` only builds indexes together with their table, so a
+    database created before an index was added to a model lacks it.
+    """
+    missing = []
+
+    with db.engine.connect() as connection:
+        inspector = inspect(connection)
+
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            existing = index_names(connection, inspector, table.name)
+            missing += [i for i in table.indexes if i.name not in existing]
+
+    # table.indexes is a set, so the order would change between runs
+    return sorted(missing, key=lambda index: index.name)
+
+
+def index_names(connection, inspector, table):
+    # SQLite's reflection skips expression indexes such as lower(niv)
+    if connection.dialect.name == "sqlite":
+        rows = connection.exec_driver_sql(f'PRAGMA index_list("{table}")')
+        return {row[1] for row in rows}
+
+    return {index["name"] for index in inspector.get_indexes(table)}
+
+
+def check_indexes(app):
+    # Duplicate NIVs and URLs are only rejected by the unique indexes
+    with app.app_context():
+        try:
+            missing = [index.name for index in missing_indexes() if index.unique]
+        except SQLAlchemyError:
+            return
+
+    if missing:
+        app.logger.error(
+            "Unique indexes %s are missing, so duplicates are not rejected; "
+            "run flask create-indexes",
+            ", ".join(missing),
+        )
+
+
+@click.command("create-indexes")
+@with_appcontext
+def create_indexes():
+    """Create missing tables and the model indexes absent from existing ones."""
+    db.create_all()
+    missing = missing_indexes()
+
+    for index in missing:
+        try:
+            index.create(db.engine)
+        except IntegrityError as e:
+            raise click.ClickException(
+                f"{index.name} can't be created, the table holds duplicates: {e.orig}"
+            )
+
+        click.echo(f"Created {index.name}")
+
+    if not missing:
+        click.echo("All indexes exist")
+
+    current_app.logger.info("Created %d missing indexes", len(missing))
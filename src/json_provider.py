@@ -0,0 +1,44 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson, with datetimes encoded natively as ISO 8601.
+
+    Anything orjson cannot encode by itself is handed to Flask's default
+    hook, so UUIDs, dataclasses and Markup keep working.
+    """
+
+    def dumps(self, obj, **kwargs):
+        return self._dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+
+        return self._app.response_class(
+            self._dumps(obj, indent), mimetype=self.mimetype
+        )
+
+    def _dumps(self, obj, indent=False):
+        option = orjson.OPT_NON_STR_KEYS
+
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+
+        if indent:
+            option |= orjson.OPT_INDENT_2
+
+        return orjson.dumps(obj, default=self.default, option=option)
+
+
+def init_json(app):
+    if app.config.get("FAST_JSON", True) and orjson is not None:
+        app.json = ORJSONProvider(app)
@@ -0,0 +1,150 @@
+from bisect import insort
+from threading import Lock
+import time
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from src.database import db, Motorcycle
+
+
+class Leaderboard:
+    """The most visited motorcycles, kept in memory and updated incrementally.
+
+    Visit counts are tracked for up to `candidates` motorcycles, loaded from
+    the `visits` column by `rebuild()`. A visit to an untracked motorcycle
+    evicts the lowest candidate outside the top and starts from the highest
+    count an untracked motorcycle could have. That count is only an upper
+    bound, so the motorcycle stays out of the top until the next rebuild
+    reads its real count; counts are reloaded every `rebuild_interval`
+    seconds. While every motorcycle fits in the candidates nothing is
+    estimated and newcomers are ranked right away.
+
+    The `size` best are kept sorted, so a read costs O(size).
+    """
+
+    def __init__(self):
+        self.size = 10
+        self.candidates = 100
+        self.rebuild_interval = 300
+        self._counts = {}
+        self._top = []
+        # Upper bound on the visits of any motorcycle not in _counts
+        self._floor = 0
+        # Candidates whose count started from _floor rather than the database
+        self._estimated = set()
+        self._rebuilt_at = None
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.size = app.config.get("LEADERBOARD_SIZE", 10)
+        # At least one more than size, so eviction never hits the top list
+        self.candidates = max(
+            app.config.get("LEADERBOARD_CANDIDATES", 100), self.size + 1
+        )
+        self.rebuild_interval = app.config.get("LEADERBOARD_REBUILD_INTERVAL", 300)
+
+        with self._lock:
+            self._counts, self._top, self._floor = {}, [], 0
+            self._estimated = set()
+            self._rebuilt_at = None
+
+        with app.app_context():
+            try:
+                self.rebuild()
+            except SQLAlchemyError:
+                # No tables yet; the first read loads it instead
+                pass
+
+        app.extensions["leaderboard"] = self
+
+    def top(self, limit=None):
+        """Return up to `limit` (niv, visits) pairs, most visited first."""
+        if (
+            self._rebuilt_at is None
+            or time.monotonic() - self._rebuilt_at >= self.rebuild_interval
+        ):
+            self.rebuild()
+
+        limit = min(limit or self.size, self.size)
+
+        with self._lock:
+            return [(niv, self._counts[niv]) for niv in self._top[: -limit - 1 : -1]]
+
+    def add(self, deltas):
+        """Count visits that were written to the database, by niv."""
+        with self._lock:
+            if self._rebuilt_at is None:
+                return
+
+            for niv, visits in deltas.items():
+                if niv not in self._counts:
+                    if len(self._counts) >= self.candidates:
+                        self._evict()
+
+                    self._counts[niv] = self._floor
+
+                    if self._floor:
+                        self._estimated.add(niv)
+
+                self._counts[niv] += visits
+
+                if niv not in self._estimated:
+                    self._promote(niv)
+
+    def discard(self, niv):
+        with self._lock:
+            if self._counts.pop(niv, None) is None:
+                return
+
+            self._estimated.discard(niv)
+
+            if niv in self._top:
+                self._top.remove(niv)
+                self._refill()
+
+    def rebuild(self):
+        # Ties are broken on niv descending so (visits, niv) is read backwards
+        statement = (
+            select(Motorcycle.niv, Motorcycle.visits)
+            .order_by(Motorcycle.visits.desc(), Motorcycle.niv.desc())
+            .limit(self.candidates)
+        )
+
+        # The lock is held through the query, so no visit counted while it
+        # runs can be dropped by the swap
+        with self._lock:
+            with db.engine.connect() as connection:
+                rows = connection.execute(statement).all()
+
+            self._counts = dict(rows)
+            self._estimated = set()
+            # Every motorcycle is tracked when fewer rows came back
+            self._floor = rows[-1][1] if len(rows) >= self.candidates else 0
+            self._refill()
+            self._rebuilt_at = time.monotonic()
+
+    def _rank(self, niv):
+        return (self._counts[niv], niv)
+
+    def _promote(self, niv):
+        # _top is sorted ascending, so the most visited sit at the end
+        if niv in self._top:
+            self._top.remove(niv)
+        elif len(self._top) >= self.size and self._rank(niv) < self._rank(self._top[0]):
+            return
+
+        insort(self._top, niv, key=self._rank)
+        del self._top[: -self.size]
+
+    def _evict(self):
+        # Estimated counts can outrank the top, which must stay tracked
+        top = set(self._top)
+        niv = min((n for n in self._counts if n not in top), key=self._rank)
+        self._floor = max(self._floor, self._counts.pop(niv))
+        self._estimated.discard(niv)
+
+    def _refill(self):
+        confirmed = (n for n in self._counts if n not in self._estimated)
+        self._top = sorted(confirmed, key=self._rank)[-self.size :]
+
+
+leaderboard = Leaderboard()
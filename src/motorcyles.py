@@ -1,21 +1,168 @@
-from flask import Blueprint, request, jsonify
-import validators
+from flask import (
+    Blueprint,
+    Response,
+    current_app,
+    jsonify,
+    request,
+    stream_with_context,
+)
+import csv
+import io
+import math
+import operator
 from src.constants.http_status_code import (
     HTTP_200_OK,
     HTTP_201_CREATED,
     HTTP_204_NO_CONTENT,
+    HTTP_207_MULTI_STATUS,
     HTTP_400_BAD_REQUEST,
     HTTP_404_NOT_FOUND,
     HTTP_409_CONFLICT,
 )
-from src.database import Motorcycle, db
+from src.bulk import BulkInsert, parse_ndjson
+from src.database import Motorcycle, VisitBucket, conflicting_field, db, normalized
+from src.cache import short_url_cache
+from src.conditional import conditional, make_etag, tag_content
+from src.counts import count_estimator
+from src.leaderboard import leaderboard
+from src.pagination import InvalidCursor, decode_cursor, encode_cursor
+from src.schemas import CREATE_VALIDATOR, UPDATE_VALIDATOR, json_type, validate
+from src.serializers import (
+    InvalidField,
+    motorcycle_to_dict,
+    motorcycles_to_dicts,
+    parse_fields,
+    project,
+    serializer_for,
+)
+from src.visits import GRANULARITIES, bucket_start, utcnow
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from flasgger import swag_from
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.exc import IntegrityError
 
 motorcycles = Blueprint("motorcycles", __name__, url_prefix="/api/v1/motorcycles")
 
 
+class InvalidFilter(ValueError):
+    pass
+
+
+RANGE_COLUMNS = [
+    "year",
+    "power",
+    "displacement",
+    "torque",
+    "dry_weight",
+    "seat_height",
+    "rating",
+    "fuel_capacity",
+]
+
+# Bounds on these are bound as integers, so the (column, niv) indexes apply
+INTEGER_RANGE_COLUMNS = {
+    column
+    for column in RANGE_COLUMNS
+    if json_type(Motorcycle.__table__.c[column]) == "integer"
+}
+
+# Query parameter -> (column, comparison), e.g. power_min=100&dry_weight_max=200
+RANGE_FILTERS = {
+    "year_from": ("year", operator.ge),
+    "year_to": ("year", operator.le),
+    **{f"{column}_min": (column, operator.ge) for column in RANGE_COLUMNS},
+    **{f"{column}_max": (column, operator.le) for column in RANGE_COLUMNS},
+}
+
+SEARCH_FILTERS = ["brand", "model", "year", "category"] + list(RANGE_FILTERS)
+
+SEARCH_PARAMETERS = SEARCH_FILTERS + [
+    "per_page",
+    "page",
+    "cursor",
+    "limit",
+    "count",
+    "fields",
+    "sort",
+]
+
+COUNT_MODES = ["exact", "estimate", "none"]
+
+# Same ceiling Flask-SQLAlchemy applies to paginate()
+MAX_PER_PAGE = 100
+MAX_CURSOR_LIMIT = 100
+
+EXPORT_PARAMETERS = SEARCH_FILTERS + ["format", "fields"]
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+EXPORT_BATCH_SIZE = 1000
+
+# NIVs matched per UPDATE/DELETE statement by the bulk endpoints
+BULK_NIV_CHUNK_SIZE = 500
+
+# Unique and cached by the short URL redirect, so only editable one at a time
+BULK_IMMUTABLE_FIELDS = ("niv", "url")
+
+STATS_PARAMETERS = ["page", "per_page", "sort"]
+
+STATS_COLUMNS = (
+    Motorcycle.visits,
+    Motorcycle.url,
+    Motorcycle.niv,
+    Motorcycle.short_url,
+)
+
+# sort= value -> ordering for ascending (False) or descending (True), always
+# ending on niv so each order matches ix_motorcycle_user_id_niv/_visits
+STATS_SORTS = {
+    "niv": lambda desc: [Motorcycle.niv.desc() if desc else Motorcycle.niv],
+    "visits": lambda desc: (
+        [Motorcycle.visits.desc(), Motorcycle.niv.desc()]
+        if desc
+        else [Motorcycle.visits, Motorcycle.niv]
+    ),
+}
+
+VISIT_PARAMETERS = ["granularity", "from", "to"]
+
+# Range returned when from= is left out, and the longest range allowed
+VISIT_DEFAULT_RANGES = {"hour": timedelta(days=1), "day": timedelta(days=30)}
+VISIT_MAX_RANGES = {"hour": timedelta(days=31), "day": timedelta(days=366)}
+
+TRENDING_COLUMNS = (
+    Motorcycle.niv,
+    Motorcycle.brand,
+    Motorcycle.model,
+    Motorcycle.year,
+    Motorcycle.short_url,
+    Motorcycle.visits,
+)
+
+# Columns read back by update_motorcycle for its response
+UPDATE_RETURNING = (
+    Motorcycle.niv,
+    Motorcycle.brand,
+    Motorcycle.model,
+    Motorcycle.year,
+    Motorcycle.url,
+    Motorcycle.short_url,
+    Motorcycle.visits,
+    Motorcycle.created_at,
+    Motorcycle.updated_at,
+)
+
+# Unique fields -> the 409 error reported when a write duplicates them
+CONFLICT_MESSAGES = {"niv": "NIV already exists", "url": "URL already exists"}
+
+# NIVs accepted by one multi-get request
+MAX_BATCH_NIVS = 100
+
+# Always loaded for single motorcycles to compute the ETag
+VALIDATOR_FIELDS = ("niv", "updated_at", "visit_count")
+
+
 @motorcycles.route("/", methods=["POST", "GET"])
 @jwt_required()
 @swag_from("./docs/motorcycles/search.yaml", methods=["GET"])
@@ -25,65 +172,10 @@ def handle_motorcycles():
 
     match request.method:
         case "POST":
-            r = request.get_json()
-            parameters = dict()
-
-            for param in [
-                "niv",
-                "brand",
-                "model",
-                "year",
-                "category",
-                "rating",
-                "displacement",
-                "power",
-                "torque",
-                "engine_cylinders",
-                "engine_stroke",
-                "gearbox",
-                "bore",
-                "stroke",
-                "transmission_type",
-                "front_brakes",
-                "rear_brakes",
-                "front_suspension",
-                "rear_suspension",
-                "front_tire",
-                "rear_tire",
-                "dry_weight",
-                "wheelbase",
-                "fuel_capacity",
-                "fuel_system",
-                "fuel_control",
-                "seat_height",
-                "cooling_system",
-                "color_options",
-                "url",
-            ]:
-                if param not in r:
-                    return (
-                        jsonify({"error": f"Missing {param} parameter"}),
-                        HTTP_400_BAD_REQUEST,
-                    )
-
-                parameters[param] = r.get(param, "")
-
-            parameters["url"] = request.get_json().get("url", "")
-
-            if not validators.url(parameters["url"]):
-                return jsonify({"error": "Invalid URL"}), HTTP_400_BAD_REQUEST
-
-            if (
-                Motorcycle.query.filter(Motorcycle.url.ilike(parameters["url"])).first()
-                is not None
-            ):
-                return jsonify({"error": "URL already exists"}), HTTP_409_CONFLICT
+            parameters = request.get_json()
 
-            if (
-                Motorcycle.query.filter(Motorcycle.niv.ilike(parameters["niv"])).first()
-                is not None
-            ):
-                return jsonify({"error": "NIV already exists"}), HTTP_409_CONFLICT
+            if error := validate(CREATE_VALIDATOR, parameters):
+                return jsonify({"error": error}), HTTP_400_BAD_REQUEST
 
             motorcycle = Motorcycle(
                 niv=parameters["niv"],
@@ -119,7 +211,12 @@ def handle_motorcycles():
                 user_id=current_user,
             )
             db.session.add(motorcycle)
-            db.session.commit()
+
+            # The unique indexes on lower(niv) and lower(url) catch duplicates
+            try:
+                db.session.commit()
+            except IntegrityError as e:
+                return conflict(e)
 
             return (
                 jsonify(
@@ -138,189 +235,568 @@ def handle_motorcycles():
             )
 
         case "GET":
+            for key in request.args.keys():
+                if key not in SEARCH_PARAMETERS:
+                    return (
+                        jsonify({"error": f"Invalid parameter - {key}"}),
+                        HTTP_400_BAD_REQUEST,
+                    )
+
+            try:
+                fields = parse_fields(request.args.get("fields"))
+            except InvalidField as e:
+                return (
+                    jsonify({"error": f"Invalid field - {e}"}),
+                    HTTP_400_BAD_REQUEST,
+                )
+
+            try:
+                query = filter_motorcycles(project(Motorcycle.query, fields))
+
+                if "sort" in request.args:
+                    query = sort_motorcycles(query)
+            except InvalidFilter as e:
+                return (
+                    jsonify({"error": f"Invalid value for parameter - {e}"}),
+                    HTTP_400_BAD_REQUEST,
+                )
+
+            if "cursor" in request.args or "limit" in request.args:
+                return list_motorcycles_by_cursor(query, fields)
+
+            count = request.args.get("count", "exact")
+
+            if count not in COUNT_MODES:
+                return (
+                    jsonify(
+                        {"error": f"Count must be one of {', '.join(COUNT_MODES)}"}
+                    ),
+                    HTTP_400_BAD_REQUEST,
+                )
+
             page = request.args.get("page", 1, type=int)
             per_page = request.args.get("per_page", 10, type=int)
 
-            match len(request.args):
-                case 0:
-                    motorcycles = Motorcycle.query.paginate(
-                        page=page, per_page=per_page
-                    )
+            if count == "exact":
+                # One aggregate both answers If-None-Match before the page is
+                # read and gives the total, so paginate doesn't count again
+                etag, total = collection_etag()
 
-                    data = []
-
-                    for motorcycle in motorcycles:
-                        data.append(
-                            {
-                                "niv": motorcycle.niv,
-                                "brand": motorcycle.brand,
-                                "model": motorcycle.model,
-                                "year": motorcycle.year,
-                                "category": motorcycle.category,
-                                "rating": motorcycle.rating,
-                                "displacement": motorcycle.displacement,
-                                "power": motorcycle.power,
-                                "torque": motorcycle.torque,
-                                "engine_cylinders": motorcycle.engine_cylinders,
-                                "engine_stroke": motorcycle.engine_stroke,
-                                "gearbox": motorcycle.gearbox,
-                                "bore": motorcycle.bore,
-                                "stroke": motorcycle.stroke,
-                                "transmission_type": motorcycle.transmission_type,
-                                "front_brakes": motorcycle.front_brakes,
-                                "rear_brakes": motorcycle.rear_brakes,
-                                "front_suspension": motorcycle.front_suspension,
-                                "rear_suspension": motorcycle.rear_suspension,
-                                "dry_weight": motorcycle.dry_weight,
-                                "wheelbase": motorcycle.wheelbase,
-                                "fuel_capacity": motorcycle.fuel_capacity,
-                                "fuel_system": motorcycle.fuel_system,
-                                "fuel_control": motorcycle.fuel_control,
-                                "seat_height": motorcycle.seat_height,
-                                "cooling_system": motorcycle.cooling_system,
-                                "color_options": motorcycle.color_options,
-                                "url": motorcycle.url,
-                                "short_url": motorcycle.short_url,
-                                "visit_count": motorcycle.visits,
-                                "created_at": motorcycle.created_at,
-                                "updated_at": motorcycle.updated_at,
-                            }
-                        )
-
-                    meta = {
-                        "page": motorcycles.page,
-                        "pages": motorcycles.pages,
-                        "total_count": motorcycles.total,
-                        "prev_page": motorcycles.prev_num,
-                        "next_page": motorcycles.next_num,
-                        "has_next": motorcycles.has_next,
-                        "has_prev": motorcycles.has_prev,
-                    }
+                if (response := conditional(etag)) is not None:
+                    return response
+
+                motorcycles = query.paginate(page=page, per_page=per_page, count=False)
+                motorcycles.total = total
+                items = motorcycles.items
+
+                meta = {
+                    "page": motorcycles.page,
+                    "pages": motorcycles.pages,
+                    "total_count": motorcycles.total,
+                    "prev_page": motorcycles.prev_num,
+                    "next_page": motorcycles.next_num,
+                    "has_next": motorcycles.has_next,
+                    "has_prev": motorcycles.has_prev,
+                }
 
+            else:
+                if page < 1 or per_page < 1:
                     return (
-                        jsonify(
-                            {
-                                "message": "Motorcycles retrieved successfully",
-                                "data": data,
-                                "meta": meta,
-                            }
-                        ),
-                        HTTP_200_OK,
+                        jsonify({"error": "Invalid page or per_page"}),
+                        HTTP_400_BAD_REQUEST,
+                    )
+
+                per_page = min(per_page, MAX_PER_PAGE)
+                items, meta = paginate_without_count(query, page, per_page)
+
+                if count == "estimate":
+                    key = tuple(
+                        (name, request.args[name].lower())
+                        for name in SEARCH_FILTERS
+                        if name in request.args
+                    )
+                    total = count_estimator.estimate(key, query)
+
+                    meta["total_count"] = total
+                    meta["pages"] = -(-total // per_page)
+                    meta["estimated"] = True
+
+            if not items and request.args:
+                return (
+                    jsonify({"error": "No motorcycles found"}),
+                    HTTP_404_NOT_FOUND,
+                )
+
+            response = jsonify(
+                {
+                    "message": "Motorcycles retrieved successfully",
+                    "data": motorcycles_to_dicts(items, fields),
+                    "meta": meta,
+                }
+            )
+
+            if count != "exact":
+                return tag_content(response)
+
+            return response, HTTP_200_OK
+
+
+def collection_etag():
+    # Changes whenever a matching row is added, removed, edited or visited
+    total, last_modified, visits = db.session.execute(
+        filter_motorcycles(
+            select(
+                func.count(),
+                func.max(Motorcycle.updated_at),
+                func.sum(Motorcycle.visits),
+            )
+        )
+    ).one()
+
+    etag = make_etag(
+        sorted(request.args.items(multi=True)), total, last_modified, visits
+    )
+
+    return etag, total
+
+
+def filter_motorcycles(query, args=None):
+    # Works for both Model.query and select() statements
+    args = request.args if args is None else args
+
+    if "brand" in args:
+        query = query.filter(normalized(Motorcycle.brand, args["brand"]))
+
+    if "model" in args:
+        query = query.filter(normalized(Motorcycle.model, args["model"]))
+
+    if "year" in args:
+        try:
+            query = query.filter(Motorcycle.year == int(args["year"]))
+        except (TypeError, ValueError):
+            raise InvalidFilter("year")
+
+    if "category" in args:
+        query = query.filter(normalized(Motorcycle.category, args["category"]))
+
+    for name, (column, compare) in RANGE_FILTERS.items():
+        if name in args:
+            try:
+                value = float(args[name])
+            except (TypeError, ValueError):
+                raise InvalidFilter(name)
+
+            if not math.isfinite(value):
+                raise InvalidFilter(name)
+
+            # Rounded inwards: year_from=2019.5 is year >= 2020
+            if column in INTEGER_RANGE_COLUMNS:
+                value = (
+                    math.ceil(value) if compare is operator.ge else math.floor(value)
+                )
+
+            query = query.filter(compare(getattr(Motorcycle, column), value))
+
+    return query
+
+
+def sort_motorcycles(query):
+    ordering = []
+
+    for key in request.args["sort"].split(","):
+        column = key.strip().removeprefix("-")
+
+        if column not in RANGE_COLUMNS:
+            raise InvalidFilter("sort")
+
+        descending = key.strip().startswith("-")
+        attribute = getattr(Motorcycle, column)
+        ordering.append(attribute.desc() if descending else attribute)
+
+    # Ties are broken on niv in the same direction, so the (column, niv)
+    # indexes can be walked forwards or backwards without a sort step
+    ordering.append(Motorcycle.niv.desc() if descending else Motorcycle.niv)
+
+    return query.order_by(*ordering)
+
+
+def paginate_without_count(query, page, per_page):
+    # One extra row tells whether there is a next page without a COUNT query
+    items = query.limit(per_page + 1).offset((page - 1) * per_page).all()
+    has_next = len(items) > per_page
+
+    meta = {
+        "page": page,
+        "pages": None,
+        "total_count": None,
+        "prev_page": page - 1 if page > 1 else None,
+        "next_page": page + 1 if has_next else None,
+        "has_next": has_next,
+        "has_prev": page > 1,
+    }
+
+    return items[:per_page], meta
+
+
+def list_motorcycles_by_cursor(query, fields):
+    if any(key in request.args for key in ["page", "per_page", "sort"]):
+        return (
+            jsonify(
+                {"error": "Cursor pagination does not accept page, per_page or sort"}
+            ),
+            HTTP_400_BAD_REQUEST,
+        )
+
+    limit = request.args.get("limit", 10, type=int)
+
+    if not 1 <= limit <= MAX_CURSOR_LIMIT:
+        return (
+            jsonify({"error": f"Limit must be between 1 and {MAX_CURSOR_LIMIT}"}),
+            HTTP_400_BAD_REQUEST,
+        )
+
+    if cursor := request.args.get("cursor"):
+        try:
+            query = query.filter(Motorcycle.niv > decode_cursor(cursor))
+        except InvalidCursor:
+            return jsonify({"error": "Invalid cursor"}), HTTP_400_BAD_REQUEST
+
+    # One extra row tells whether there is a next page without a COUNT query
+    motorcycles = query.order_by(Motorcycle.niv).limit(limit + 1).all()
+    has_next = len(motorcycles) > limit
+    motorcycles = motorcycles[:limit]
+
+    meta = {
+        "limit": limit,
+        "has_next": has_next,
+        "next_cursor": encode_cursor(motorcycles[-1].niv) if has_next else None,
+    }
+
+    return tag_content(
+        jsonify(
+            {
+                "message": "Motorcycles retrieved successfully",
+                "data": motorcycles_to_dicts(motorcycles, fields),
+                "meta": meta,
+            }
+        )
+    )
+
+
+@motorcycles.get("/export")
+@jwt_required()
+@swag_from("./docs/motorcycles/export.yaml")
+def export_motorcycles():
+    for key in request.args.keys():
+        if key not in EXPORT_PARAMETERS:
+            return (
+                jsonify({"error": f"Invalid parameter - {key}"}),
+                HTTP_400_BAD_REQUEST,
+            )
+
+    export_format = request.args.get("format", "ndjson")
+
+    if export_format not in EXPORT_FORMATS:
+        return (
+            jsonify({"error": f"Format must be one of {', '.join(EXPORT_FORMATS)}"}),
+            HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        fields = parse_fields(request.args.get("fields"))
+    except InvalidField as e:
+        return jsonify({"error": f"Invalid field - {e}"}), HTTP_400_BAD_REQUEST
+
+    serializer = serializer_for(fields)
+
+    try:
+        statement = filter_motorcycles(select(*serializer.columns))
+    except InvalidFilter as e:
+        return (
+            jsonify({"error": f"Invalid value for parameter - {e}"}),
+            HTTP_400_BAD_REQUEST,
+        )
+
+    statement = statement.order_by(Motorcycle.niv)
+
+    def generate():
+        # yield_per streams rows from a server-side cursor, one batch at a time
+        result = db.session.execute(
+            statement.execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+
+        if export_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(serializer.fields)
+
+        for rows in result.partitions():
+            if export_format == "csv":
+                writer.writerows(
+                    [
+                        value.isoformat() if isinstance(value, datetime) else value
+                        for value in row
+                    ]
+                    for row in rows
+                )
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            else:
+                yield "".join(
+                    current_app.json.dumps(dict(zip(serializer.fields, row))) + "\n"
+                    for row in rows
+                )
+
+        if export_format == "csv" and buffer.tell():
+            yield buffer.getvalue()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={
+            "Content-Disposition": f"attachment; filename=motorcycles.{export_format}"
+        },
+    )
+
+
+@motorcycles.post("/bulk")
+@jwt_required()
+@swag_from("./docs/motorcycles/bulk.yaml")
+def bulk_insert_motorcycles():
+    current_user = get_jwt_identity()
+
+    if request.mimetype == "application/x-ndjson":
+        # Read line by line so a large catalog is never held in memory at once
+        items = parse_ndjson(request.stream)
+    else:
+        items = request.get_json(silent=True)
+
+        if not isinstance(items, list):
+            return (
+                jsonify({"error": "Expected a JSON array or NDJSON"}),
+                HTTP_400_BAD_REQUEST,
+            )
+
+    bulk = BulkInsert(current_user)
+    results = bulk.run(items, current_app.config.get("BULK_CHUNK_SIZE", 500))
+
+    if not results:
+        return jsonify({"error": "No motorcycles given"}), HTTP_400_BAD_REQUEST
+
+    return (
+        jsonify({"created": bulk.created, "failed": bulk.failed, "results": results}),
+        HTTP_207_MULTI_STATUS if bulk.failed else HTTP_201_CREATED,
+    )
+
+
+@motorcycles.patch("/bulk")
+@jwt_required()
+@swag_from("./docs/motorcycles/bulk_update.yaml")
+def bulk_update_motorcycles():
+    body = request.get_json(silent=True)
+
+    if not isinstance(body, dict):
+        return jsonify({"error": "Expected a JSON object"}), HTTP_400_BAD_REQUEST
+
+    patch = body.get("set")
+
+    if not isinstance(patch, dict) or not patch:
+        return jsonify({"error": "Missing set parameter"}), HTTP_400_BAD_REQUEST
+
+    for key in patch:
+        if key in BULK_IMMUTABLE_FIELDS:
+            return (
+                jsonify({"error": f"{key} can't be changed in bulk"}),
+                HTTP_400_BAD_REQUEST,
+            )
+
+    if error := validate(UPDATE_VALIDATOR, patch):
+        return jsonify({"error": error}), HTTP_400_BAD_REQUEST
+
+    try:
+        criteria = bulk_criteria(body)
+    except InvalidFilter as e:
+        return (
+            jsonify({"error": f"Invalid value for parameter - {e}"}),
+            HTTP_400_BAD_REQUEST,
+        )
+
+    table = Motorcycle.__table__
+    statement = update(table).values(**patch, updated_at=datetime.now())
+    rows = run_bulk(statement, criteria, db.engine.dialect.update_returning)
+    db.session.commit()
+
+    return jsonify(bulk_report("updated", body, rows)), HTTP_200_OK
+
+
+@motorcycles.delete("/bulk")
+@jwt_required()
+@swag_from("./docs/motorcycles/bulk_delete.yaml")
+def bulk_delete_motorcycles():
+    body = request.get_json(silent=True)
+
+    if not isinstance(body, dict):
+        return jsonify({"error": "Expected a JSON object"}), HTTP_400_BAD_REQUEST
+
+    try:
+        criteria = bulk_criteria(body)
+    except InvalidFilter as e:
+        return (
+            jsonify({"error": f"Invalid value for parameter - {e}"}),
+            HTTP_400_BAD_REQUEST,
+        )
+
+    statement = delete(Motorcycle.__table__)
+    rows = run_bulk(statement, criteria, db.engine.dialect.delete_returning)
+    db.session.commit()
+
+    for niv, short_url in rows:
+        short_url_cache.invalidate(short_url)
+        leaderboard.discard(niv)
+
+    return jsonify(bulk_report("deleted", body, rows)), HTTP_200_OK
+
+
+def bulk_criteria(body):
+    # Either {"niv": [...]} or {"filter": {...}} with the search parameters
+    if ("niv" in body) == ("filter" in body):
+        raise InvalidFilter("niv or filter")
+
+    if "filter" in body:
+        filters = body["filter"]
+
+        if not isinstance(filters, dict) or not filters:
+            raise InvalidFilter("filter")
+
+        for key, value in filters.items():
+            if key not in SEARCH_FILTERS:
+                raise InvalidFilter(key)
+
+            # Lists or objects would only fail in the driver
+            if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+                raise InvalidFilter(key)
+
+        # The same strings a query string would carry, so lower() gets text
+        filters = {key: str(value) for key, value in filters.items()}
+
+        return [filter_motorcycles(select(Motorcycle.niv), filters).whereclause]
+
+    nivs = body["niv"]
+
+    if not isinstance(nivs, list) or not all(isinstance(niv, str) for niv in nivs):
+        raise InvalidFilter("niv")
+
+    # Matched on lower(niv) to use its index, a chunk of NIVs per statement
+    keys = list(dict.fromkeys(niv.lower() for niv in nivs))
+
+    return [
+        func.lower(Motorcycle.niv).in_(keys[i : i + BULK_NIV_CHUNK_SIZE])
+        for i in range(0, len(keys), BULK_NIV_CHUNK_SIZE)
+    ]
+
+
+def run_bulk(statement, criteria, returning):
+    rows = []
+
+    for criterion in criteria:
+        if returning:
+            rows.extend(
+                db.session.execute(
+                    statement.where(criterion).returning(
+                        Motorcycle.niv, Motorcycle.short_url
                     )
+                ).all()
+            )
+        else:
+            # Without RETURNING, read the affected rows in the same transaction
+            rows.extend(
+                db.session.execute(
+                    select(Motorcycle.niv, Motorcycle.short_url).where(criterion)
+                ).all()
+            )
+            db.session.execute(statement.where(criterion))
+
+    return rows
+
+
+def bulk_report(action, body, rows):
+    nivs = [niv for niv, _ in rows]
+    report = {action: len(nivs), "nivs": nivs}
 
-                case _:
-                    data = []
-
-                    query = Motorcycle.query
-
-                    for key in request.args.keys():
-                        if key not in [
-                            "brand",
-                            "model",
-                            "year",
-                            "category",
-                            "per_page",
-                            "page",
-                        ]:
-                            return (
-                                jsonify(
-                                    {
-                                        "error": f"Invalid parameter - {key}"
-                                    }
-                                ),
-                                HTTP_400_BAD_REQUEST,
-                            )
-
-                    if "brand" in request.args.keys():
-                        query = query.filter(
-                            Motorcycle.brand.ilike(request.args["brand"])
-                        )
-
-                    if "model" in request.args.keys():
-                        query = query.filter(
-                            Motorcycle.model.ilike(request.args["model"])
-                        )
-
-                    if "year" in request.args.keys():
-                        query = query.filter(
-                            Motorcycle.year.ilike(request.args["year"])
-                        )
-
-                    if "category" in request.args.keys():
-                        query = query.filter(
-                            Motorcycle.category.ilike(request.args["category"])
-                        )
-
-                    motorcycles = query.paginate(page=page, per_page=per_page)
-
-                    match len(motorcycles.items):
-                        case 0:
-                            return (
-                                jsonify({"error": "No motorcycles found"}),
-                                HTTP_404_NOT_FOUND,
-                            )
-
-                        case _:
-                            for motorcycle in motorcycles:
-                                data.append(
-                                    {
-                                        "niv": motorcycle.niv,
-                                        "brand": motorcycle.brand,
-                                        "model": motorcycle.model,
-                                        "year": motorcycle.year,
-                                        "category": motorcycle.category,
-                                        "rating": motorcycle.rating,
-                                        "displacement": motorcycle.displacement,
-                                        "power": motorcycle.power,
-                                        "torque": motorcycle.torque,
-                                        "engine_cylinders": motorcycle.engine_cylinders,
-                                        "engine_stroke": motorcycle.engine_stroke,
-                                        "gearbox": motorcycle.gearbox,
-                                        "bore": motorcycle.bore,
-                                        "stroke": motorcycle.stroke,
-                                        "transmission_type": motorcycle.transmission_type,
-                                        "front_brakes": motorcycle.front_brakes,
-                                        "rear_brakes": motorcycle.rear_brakes,
-                                        "front_suspension": motorcycle.front_suspension,
-                                        "rear_suspension": motorcycle.rear_suspension,
-                                        "front_tire": motorcycle.front_tire,
-                                        "rear_tire": motorcycle.rear_tire,
-                                        "dry_weight": motorcycle.dry_weight,
-                                        "wheelbase": motorcycle.wheelbase,
-                                        "fuel_capacity": motorcycle.fuel_capacity,
-                                        "fuel_system": motorcycle.fuel_system,
-                                        "fuel_control": motorcycle.fuel_control,
-                                        "seat_height": motorcycle.seat_height,
-                                        "cooling_system": motorcycle.cooling_system,
-                                        "color_options": motorcycle.color_options,
-                                        "url": motorcycle.url,
-                                        "short_url": motorcycle.short_url,
-                                        "visit_count": motorcycle.visits,
-                                        "created_at": motorcycle.created_at,
-                                        "updated_at": motorcycle.updated_at,
-                                    }
-                                )
-
-                            meta = {
-                                "page": motorcycles.page,
-                                "pages": motorcycles.pages,
-                                "total_count": motorcycles.total,
-                                "prev_page": motorcycles.prev_num,
-                                "next_page": motorcycles.next_num,
-                                "has_next": motorcycles.has_next,
-                                "has_prev": motorcycles.has_prev,
-                            }
-
-                            return (
-                                jsonify(
-                                    {
-                                        "message": "Motorcycles retrieved successfully",
-                                        "data": data,
-                                        "meta": meta,
-                                    }
-                                ),
-                                HTTP_200_OK,
-                            )
+    if "niv" in body:
+        found = {niv.lower() for niv in nivs}
+        report["missing"] = [niv for niv in body["niv"] if niv.lower() not in found]
+
+    return report
+
+
+@motorcycles.route("/batch", methods=["GET", "POST"])
+@jwt_required()
+@swag_from("./docs/motorcycles/batch.yaml")
+def get_motorcycles_batch():
+    if request.method == "POST":
+        body = request.get_json(silent=True)
+        nivs = body.get("niv") if isinstance(body, dict) else None
+
+        if not isinstance(nivs, list) or not all(isinstance(n, str) for n in nivs):
+            return (
+                jsonify({"error": "Expected a JSON object with a list of NIVs"}),
+                HTTP_400_BAD_REQUEST,
+            )
+    else:
+        # Both ?niv=a,b and ?niv=a&niv=b are accepted
+        nivs = [
+            niv for value in request.args.getlist("niv") for niv in value.split(",")
+        ]
+
+    # Duplicates are answered once, in the position they first appear
+    requested = {}
+
+    for niv in map(str.strip, nivs):
+        if niv:
+            requested.setdefault(niv.lower(), niv)
+
+    if not requested:
+        return jsonify({"error": "Missing niv parameter"}), HTTP_400_BAD_REQUEST
+
+    if len(requested) > MAX_BATCH_NIVS:
+        return (
+            jsonify({"error": f"At most {MAX_BATCH_NIVS} NIVs can be fetched at once"}),
+            HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        fields = parse_fields(request.args.get("fields"))
+    except InvalidField as e:
+        return jsonify({"error": f"Invalid field - {e}"}), HTTP_400_BAD_REQUEST
+
+    # One query on the lower(niv) index for the whole batch
+    found = {
+        motorcycle.niv.lower(): motorcycle
+        for motorcycle in project(
+            Motorcycle.query, tuple(dict.fromkeys(fields + VALIDATOR_FIELDS))
+        ).filter(func.lower(Motorcycle.niv).in_(requested))
+    }
+    matched = [found[key] for key in requested if key in found]
+
+    if request.method == "GET":
+        etag = make_etag(
+            fields, list(requested), [(m.niv, m.updated_at, m.visits) for m in matched]
+        )
+
+        if (response := conditional(etag)) is not None:
+            return response
+
+    return (
+        jsonify(
+            {
+                "data": motorcycles_to_dicts(matched, fields),
+                "missing": [niv for key, niv in requested.items() if key not in found],
+            }
+        ),
+        HTTP_200_OK,
+    )
 
 
 @motorcycles.get("/<string:motorcycles_niv>")
@@ -328,49 +804,31 @@ def handle_motorcycles():
 @swag_from("./docs/motorcycles/get.yaml")
 def get_motorcycles(motorcycles_niv):
     current_user = get_jwt_identity()
-    motorcycle = Motorcycle.query.filter(Motorcycle.niv.ilike(motorcycles_niv)).first()
+
+    try:
+        fields = parse_fields(request.args.get("fields"))
+    except InvalidField as e:
+        return jsonify({"error": f"Invalid field - {e}"}), HTTP_400_BAD_REQUEST
+
+    motorcycle = (
+        project(Motorcycle.query, tuple(dict.fromkeys(fields + VALIDATOR_FIELDS)))
+        .filter(normalized(Motorcycle.niv, motorcycles_niv))
+        .first()
+    )
 
     if motorcycle:
+        etag = make_etag(
+            motorcycle.niv, motorcycle.updated_at, motorcycle.visits, fields
+        )
+
+        if (response := conditional(etag)) is not None:
+            return response
+
         return (
             jsonify(
                 {
                     "message": "Motorcycle retrieved successfully",
-                    "data": {
-                        "niv": motorcycle.niv,
-                        "brand": motorcycle.brand,
-                        "model": motorcycle.model,
-                        "year": motorcycle.year,
-                        "category": motorcycle.category,
-                        "rating": motorcycle.rating,
-                        "displacement": motorcycle.displacement,
-                        "power": motorcycle.power,
-                        "torque": motorcycle.torque,
-                        "engine_cylinders": motorcycle.engine_cylinders,
-                        "engine_stroke": motorcycle.engine_stroke,
-                        "gearbox": motorcycle.gearbox,
-                        "bore": motorcycle.bore,
-                        "stroke": motorcycle.stroke,
-                        "transmission_type": motorcycle.transmission_type,
-                        "front_brakes": motorcycle.front_brakes,
-                        "rear_brakes": motorcycle.rear_brakes,
-                        "front_suspension": motorcycle.front_suspension,
-                        "rear_suspension": motorcycle.rear_suspension,
-                        "front_tire": motorcycle.front_tire,
-                        "rear_tire": motorcycle.rear_tire,
-                        "dry_weight": motorcycle.dry_weight,
-                        "wheelbase": motorcycle.wheelbase,
-                        "fuel_capacity": motorcycle.fuel_capacity,
-                        "fuel_system": motorcycle.fuel_system,
-                        "fuel_control": motorcycle.fuel_control,
-                        "seat_height": motorcycle.seat_height,
-                        "cooling_system": motorcycle.cooling_system,
-                        "color_options": motorcycle.color_options,
-                        "url": motorcycle.url,
-                        "short_url": motorcycle.short_url,
-                        "visit_count": motorcycle.visits,
-                        "created_at": motorcycle.created_at,
-                        "updated_at": motorcycle.updated_at,
-                    },
+                    "data": motorcycle_to_dict(motorcycle, fields),
                 }
             ),
             HTTP_200_OK,
@@ -386,64 +844,42 @@ def get_motorcycles(motorcycles_niv):
 def update_motorcycle(motorcycles_niv):
     print(motorcycles_niv)
     current_user = get_jwt_identity()
-    motorcycle = Motorcycle.query.filter(Motorcycle.niv.ilike(motorcycles_niv)).first()
-
-    available_parameters = [
-        "niv",
-        "brand",
-        "model",
-        "year",
-        "category",
-        "rating",
-        "displacement",
-        "power",
-        "torque",
-        "engine_cylinders",
-        "engine_stroke",
-        "gearbox",
-        "bore",
-        "stroke",
-        "transmission_type",
-        "front_brakes",
-        "rear_brakes",
-        "front_suspension",
-        "rear_suspension",
-        "front_tire",
-        "rear_tire",
-        "dry_weight",
-        "wheelbase",
-        "fuel_capacity",
-        "fuel_system",
-        "fuel_control",
-        "seat_height",
-        "cooling_system",
-        "color_options",
-        "url",
-    ]
 
-    if motorcycle:
-        # Get all the data from the request to create a new motorcycle
-        if url:= request.json.get("url", None):
-
-            if not validators.url(url):
-                return jsonify(
-                    {"error": "Invalid parameter - {url}"}), HTTP_400_BAD_REQUEST
-                
-
-            if Motorcycle.query.filter_by(url=url).first() is not None:
-                return jsonify(
-                    {"error": "URL already exists"}), HTTP_409_CONFLICT
-            
-        for key in request.json:
-            if key not in available_parameters:
-                return jsonify(
-                    {"error": f"Invalid parameter - {key}"}), HTTP_400_BAD_REQUEST
-                
-            else:
-                setattr(motorcycle, key, request.json.get(key))
+    if error := validate(UPDATE_VALIDATOR, request.json):
+        return jsonify({"error": error}), HTTP_400_BAD_REQUEST
+
+    # One statement: duplicates are left to the unique indexes to report
+    statement = (
+        update(Motorcycle.__table__)
+        .where(normalized(Motorcycle.niv, motorcycles_niv))
+        .values(**request.json, updated_at=datetime.now())
+    )
+
+    try:
+        if db.engine.dialect.update_returning:
+            motorcycle = db.session.execute(
+                statement.returning(*UPDATE_RETURNING)
+            ).first()
+        elif db.session.execute(statement).rowcount:
+            motorcycle = db.session.execute(
+                select(*UPDATE_RETURNING).where(
+                    normalized(Motorcycle.niv, request.json.get("niv", motorcycles_niv))
+                )
+            ).first()
+        else:
+            motorcycle = None
 
-        motorcycle.updated_at = datetime.now()
         db.session.commit()
+    except IntegrityError as e:
+        return conflict(e)
+
+    if motorcycle:
+        if "url" in request.json or "niv" in request.json:
+            short_url_cache.invalidate(motorcycle.short_url)
+
+        # Ranked again under the new NIV by the next rebuild
+        if motorcycle.niv != motorcycles_niv:
+            leaderboard.discard(motorcycles_niv)
 
         return (
             jsonify(
@@ -470,17 +906,31 @@ def update_motorcycle(motorcycles_niv):
     
 
 
+def conflict(error):
+    db.session.rollback()
+
+    if (field := conflicting_field(error)) not in CONFLICT_MESSAGES:
+        raise error
+
+    return jsonify({"error": CONFLICT_MESSAGES[field]}), HTTP_409_CONFLICT
+
+
 @motorcycles.delete("/<string:motorcycles_niv>")
 @jwt_required()
 @swag_from("./docs/motorcycles/delete.yaml")
 def delete_motorcycle(motorcycles_niv):
     current_user = get_jwt_identity()
-    motorcycle = Motorcycle.query.filter(Motorcycle.niv.ilike(motorcycles_niv)).first()
+    motorcycle = Motorcycle.query.filter(
+        normalized(Motorcycle.niv, motorcycles_niv)
+    ).first()
 
     if motorcycle:
         db.session.delete(motorcycle)
         db.session.commit()
 
+        short_url_cache.invalidate(motorcycle.short_url)
+        leaderboard.discard(motorcycle.niv)
+
         return jsonify({}), HTTP_204_NO_CONTENT
 
     return (
@@ -493,26 +943,216 @@ def delete_motorcycle(motorcycles_niv):
 @jwt_required()
 @swag_from("./docs/motorcycles/stats.yaml")
 def get_stats():
-    current_user = get_jwt_identity()
-    motorcycles = Motorcycle.query.filter(Motorcycle.user_id.ilike(current_user)).all()
+    for key in request.args.keys():
+        if key not in STATS_PARAMETERS:
+            return (
+                jsonify({"error": f"Invalid parameter - {key}"}),
+                HTTP_400_BAD_REQUEST,
+            )
 
-    data = []
+    sort = request.args.get("sort", "niv")
 
-    for motorcycle in motorcycles:
-        new_link = {
-            "visits": motorcycle.visits,
-            "url": motorcycle.url,
-            "niv": motorcycle.niv,
-            "short_url": motorcycle.short_url,
-        }
+    if sort.removeprefix("-") not in STATS_SORTS:
+        return (
+            jsonify({"error": "Invalid value for parameter - sort"}),
+            HTTP_400_BAD_REQUEST,
+        )
+
+    page = request.args.get("page", 1, type=int)
+    per_page = request.args.get("per_page", 10, type=int)
+
+    if page < 1 or per_page < 1:
+        return jsonify({"error": "Invalid page or per_page"}), HTTP_400_BAD_REQUEST
+
+    per_page = min(per_page, MAX_PER_PAGE)
+    owned = Motorcycle.user_id == get_jwt_identity()
+
+    total, visits = db.session.execute(
+        select(func.count(), func.coalesce(func.sum(Motorcycle.visits), 0)).where(owned)
+    ).one()
 
-        data.append(new_link)
+    rows = db.session.execute(
+        select(*STATS_COLUMNS)
+        .where(owned)
+        .order_by(*STATS_SORTS[sort.removeprefix("-")](sort.startswith("-")))
+        .limit(per_page)
+        .offset((page - 1) * per_page)
+    )
+
+    pages = -(-total // per_page)
 
     return (
         jsonify(
             {
                 "message": "Motorcycles related to user retrieved successfully",
+                "data": [dict(row._mapping) for row in rows],
+                "totals": {"motorcycles": total, "visits": visits},
+                "meta": {
+                    "page": page,
+                    "pages": pages,
+                    "total_count": total,
+                    "prev_page": page - 1 if page > 1 else None,
+                    "next_page": page + 1 if page < pages else None,
+                    "has_next": page < pages,
+                    "has_prev": page > 1,
+                },
+            }
+        ),
+        HTTP_200_OK,
+    )
+
+
+@motorcycles.get("/stats/<string:short_url>")
+@jwt_required()
+@swag_from("./docs/motorcycles/stats_visits.yaml")
+def get_visit_stats(short_url):
+    for key in request.args.keys():
+        if key not in VISIT_PARAMETERS:
+            return (
+                jsonify({"error": f"Invalid parameter - {key}"}),
+                HTTP_400_BAD_REQUEST,
+            )
+
+    granularity = request.args.get("granularity", "hour")
+
+    if granularity not in GRANULARITIES:
+        return (
+            jsonify(
+                {"error": f"Granularity must be one of {', '.join(GRANULARITIES)}"}
+            ),
+            HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        end = parse_time("to") or utcnow()
+        start = parse_time("from") or end - VISIT_DEFAULT_RANGES[granularity]
+    except InvalidFilter as e:
+        return (
+            jsonify({"error": f"Invalid value for parameter - {e}"}),
+            HTTP_400_BAD_REQUEST,
+        )
+
+    if not timedelta(0) <= end - start <= VISIT_MAX_RANGES[granularity]:
+        return (
+            jsonify(
+                {
+                    "error": f"Range must be at most "
+                    f"{VISIT_MAX_RANGES[granularity].days} days per {granularity}"
+                }
+            ),
+            HTTP_400_BAD_REQUEST,
+        )
+
+    niv = db.session.scalar(
+        select(Motorcycle.niv).where(
+            Motorcycle.short_url == short_url,
+            Motorcycle.user_id == get_jwt_identity(),
+        )
+    )
+
+    if niv is None:
+        return (
+            jsonify({"error": f"Short URL - {short_url} - not found"}),
+            HTTP_404_NOT_FOUND,
+        )
+
+    rows = db.session.execute(
+        select(VisitBucket.start, VisitBucket.visits)
+        .where(
+            VisitBucket.short_url == short_url,
+            VisitBucket.granularity == granularity,
+            VisitBucket.start >= bucket_start(start, granularity),
+            VisitBucket.start <= end,
+        )
+        .order_by(VisitBucket.start)
+    ).all()
+
+    return (
+        jsonify(
+            {
+                "message": "Visits retrieved successfully",
+                "data": [
+                    {"start": row.start.isoformat(), "visits": row.visits}
+                    for row in rows
+                ],
+                "meta": {
+                    "niv": niv,
+                    "short_url": short_url,
+                    "granularity": granularity,
+                    "from": start.isoformat(),
+                    "to": end.isoformat(),
+                    "total": sum(row.visits for row in rows),
+                },
+            }
+        ),
+        HTTP_200_OK,
+    )
+
+
+def parse_time(name):
+    value = request.args.get(name)
+
+    if value is None:
+        return None
+
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise InvalidFilter(name)
+
+    # Buckets are naive UTC, so aware times are converted and naive ones
+    # are taken as UTC already
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+    return moment
+
+
+@motorcycles.get("/trending")
+@jwt_required()
+@swag_from("./docs/motorcycles/trending.yaml")
+def get_trending_motorcycles():
+    for key in request.args.keys():
+        if key != "limit":
+            return (
+                jsonify({"error": f"Invalid parameter - {key}"}),
+                HTTP_400_BAD_REQUEST,
+            )
+
+    limit = request.args.get("limit", leaderboard.size, type=int)
+
+    if not 1 <= limit <= leaderboard.size:
+        return (
+            jsonify({"error": f"Limit must be between 1 and {leaderboard.size}"}),
+            HTTP_400_BAD_REQUEST,
+        )
+
+    nivs = [niv for niv, _ in leaderboard.top(limit)]
+    rows = db.session.execute(
+        select(*TRENDING_COLUMNS).where(Motorcycle.niv.in_(nivs))
+    ).all()
+
+    # Ranked and reported by the stored count, which may be ahead of the
+    # leaderboard; rows renamed or deleted elsewhere are simply missing
+    rows.sort(key=lambda row: (row.visits, row.niv), reverse=True)
+    data = [
+        {
+            "niv": row.niv,
+            "brand": row.brand,
+            "model": row.model,
+            "year": row.year,
+            "short_url": row.short_url,
+            "visit_count": row.visits,
+        }
+        for row in rows
+    ]
+
+    return (
+        jsonify(
+            {
+                "message": "Trending motorcycles retrieved successfully",
                 "data": data,
+                "meta": {"limit": limit},
             }
         ),
         HTTP_200_OK,
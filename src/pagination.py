@@ -0,0 +1,26 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+import binascii
+import json
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(niv):
+    payload = json.dumps({"niv": niv}, separators=(",", ":")).encode()
+    return urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(urlsafe_b64decode(padded.encode()))
+        niv = payload["niv"]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise InvalidCursor(cursor)
+
+    if not isinstance(niv, str):
+        raise InvalidCursor(cursor)
+
+    return niv
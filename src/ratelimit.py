@@ -0,0 +1,173 @@
+from threading import Lock, local
+import math
+import sqlite3
+import time
+from flask import current_app, jsonify, request
+from flask_jwt_extended import decode_token
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
+from src.constants.http_status_code import HTTP_429_TOO_MANY_REQUESTS
+
+# Buckets idle for longer than this are refilled anyway, so they are dropped
+PURGE_AFTER = 24 * 3600
+
+
+class TokenBucketStore:
+    """Token buckets kept in a SQLite file shared by every worker on the host.
+
+    Each take runs in a `BEGIN IMMEDIATE` transaction, so concurrent workers
+    serialize on the bucket update instead of overdrawing it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = local()
+
+    def take(self, key, capacity, rate, now=None):
+        """Take one token; return 0 if allowed, else the seconds to wait."""
+        now = time.time() if now is None else now
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+
+        try:
+            row = connection.execute(
+                "SELECT tokens, updated FROM bucket WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                tokens = capacity
+            else:
+                tokens = min(capacity, row[0] + (now - row[1]) * rate)
+
+            if tokens < 1:
+                connection.execute("COMMIT")
+                return (1 - tokens) / rate
+
+            connection.execute(
+                "INSERT INTO bucket (key, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE "
+                "SET tokens = excluded.tokens, updated = excluded.updated",
+                (key, tokens - 1, now),
+            )
+            connection.execute("COMMIT")
+            return 0
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def purge(self, before):
+        self._connection().execute("DELETE FROM bucket WHERE updated < ?", (before,))
+
+    def _connection(self):
+        # sqlite3 connections can't be shared between threads
+        connection = getattr(self._local, "connection", None)
+
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            connection.execute("PRAGMA journal_mode = WAL")
+            # Losing the last few updates in a crash only refills some buckets
+            connection.execute("PRAGMA synchronous = OFF")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS bucket ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL"
+                ") WITHOUT ROWID"
+            )
+            self._local.connection = connection
+
+        return connection
+
+
+class RateLimiter:
+    """Token bucket limits per endpoint or blueprint, keyed by token or client IP.
+
+    `RATELIMIT_POLICIES` maps an endpoint (e.g. "auth.login") or blueprint
+    name to `(capacity, rate)`: a client may burst up to `capacity`
+    requests and then gets `rate` more per second. An endpoint's own policy
+    wins over its blueprint's, and requests matching neither are not
+    limited. Settings are read per request, so they can be changed on a
+    running app.
+
+    Clients sending a valid bearer token are keyed by its identity, so every
+    token issued to a user draws from one bucket. The token is only checked
+    for its signature and expiry, leaving the blocklist to `@jwt_required`.
+    Anything else is keyed by client IP, as are the endpoints in
+    `RATELIMIT_BY_IP`, which don't check the token at all.
+    """
+
+    def __init__(self):
+        self._stores = {}
+        self._purged_at = 0
+        self._lock = Lock()
+
+    def init_app(self, app):
+        app.before_request(self.check)
+        app.extensions["rate_limiter"] = self
+
+    def check(self):
+        config = current_app.config
+
+        if not config.get("RATELIMIT_ENABLED", False):
+            return None
+
+        policies = config.get("RATELIMIT_POLICIES", {})
+        name = request.endpoint if request.endpoint in policies else request.blueprint
+
+        if name not in policies:
+            return None
+
+        capacity, rate = policies[name]
+        by_ip = request.endpoint in config.get("RATELIMIT_BY_IP", ())
+        store = self.store(config["RATELIMIT_STORAGE"])
+
+        try:
+            wait = store.take(f"{name}:{client_key(by_ip)}", capacity, rate)
+            self._purge(store)
+        except sqlite3.Error:
+            # A broken limiter must not take the API down with it
+            current_app.logger.exception("Rate limit check failed")
+            return None
+
+        if not wait:
+            return None
+
+        return (
+            jsonify({"error": "Too many requests, try again later"}),
+            HTTP_429_TOO_MANY_REQUESTS,
+            {"Retry-After": str(math.ceil(wait))},
+        )
+
+    def store(self, path):
+        with self._lock:
+            if path not in self._stores:
+                self._stores[path] = TokenBucketStore(path)
+
+            return self._stores[path]
+
+    def _purge(self, store):
+        now = time.time()
+
+        if now - self._purged_at < 3600:
+            return
+
+        self._purged_at = now
+        store.purge(now - PURGE_AFTER)
+
+
+def client_key(by_ip=False):
+    authorization = request.headers.get("Authorization", "")
+
+    if not by_ip and authorization.startswith("Bearer "):
+        try:
+            claims = decode_token(authorization[len("Bearer ") :])
+            identity = claims[current_app.config["JWT_IDENTITY_CLAIM"]]
+        except (JWTExtendedException, PyJWTError, KeyError):
+            # Made-up tokens must not open buckets of their own
+            identity = None
+
+        if identity is not None:
+            return f"user:{identity}"
+
+    return f"ip:{request.remote_addr}"
+
+
+rate_limiter = RateLimiter()
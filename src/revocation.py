@@ -0,0 +1,218 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from threading import Lock
+import hashlib
+import time
+from sqlalchemy import delete, func, select
+from src.database import RevokedToken, db
+
+
+class BloomFilter:
+    """Set membership with no false negatives in a fixed number of bits."""
+
+    def __init__(self, size=1 << 20, hashes=7):
+        self.size = size
+        self.hashes = hashes
+        self._bits = bytearray((size + 7) // 8)
+
+    def _positions(self, key):
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+
+class TokenBlocklist:
+    """Answers flask_jwt_extended's blocklist check mostly from memory.
+
+    Every revoked JTI is added to a Bloom filter, so a token that was never
+    revoked, by far the common case, is cleared without touching the
+    database. JTIs revoked recently are also kept in an exact set that
+    confirms them directly; only the filter's rare false positives are
+    looked up in the `revoked_token` table.
+
+    Revocations made by other workers are pulled incrementally by
+    `revoked_at` every `sync_interval` seconds, and the filter is rebuilt
+    from the unexpired rows every `rebuild_interval` seconds. Each sync
+    reads `sync_overlap` seconds back from the newest row seen, so rows
+    that commit after a newer one are still picked up.
+    """
+
+    def __init__(self):
+        self.sync_interval = 10
+        self.sync_overlap = 60
+        self.rebuild_interval = 3600
+        self.bloom_size = 1 << 20
+        self.bloom_hashes = 7
+        self.recent_size = 10000
+        self._bloom = BloomFilter(self.bloom_size, self.bloom_hashes)
+        self._recent = OrderedDict()
+        self._synced_until = None
+        self._synced_at = None
+        self._rebuilt_at = None
+        self._lock = Lock()
+        self._sync_lock = Lock()
+        self._reset_stats()
+
+    def init_app(self, app):
+        self.sync_interval = app.config.get("REVOCATION_SYNC_INTERVAL", 10)
+        self.sync_overlap = app.config.get("REVOCATION_SYNC_OVERLAP", 60)
+        self.rebuild_interval = app.config.get("REVOCATION_REBUILD_INTERVAL", 3600)
+        self.bloom_size = app.config.get("REVOCATION_BLOOM_SIZE", 1 << 20)
+        self.bloom_hashes = app.config.get("REVOCATION_BLOOM_HASHES", 7)
+        self.recent_size = app.config.get("REVOCATION_RECENT_SIZE", 10000)
+
+        with self._lock:
+            self._bloom = BloomFilter(self.bloom_size, self.bloom_hashes)
+            self._recent.clear()
+            self._synced_until = self._synced_at = self._rebuilt_at = None
+
+        self._reset_stats()
+        app.extensions["token_blocklist"] = self
+
+    def is_revoked(self, jwt_header, jwt_payload):
+        self._refresh()
+        jti = jwt_payload["jti"]
+
+        with self._lock:
+            if jti in self._recent:
+                self._recent.move_to_end(jti)
+                self._stats["exact_hits"] += 1
+                return True
+
+            if jti not in self._bloom:
+                self._stats["bloom_negatives"] += 1
+                return False
+
+            self._stats["db_checks"] += 1
+
+        revoked = db.session.get(RevokedToken, jti) is not None
+
+        if revoked:
+            self._remember(jti)
+
+        return revoked
+
+    def revoke(self, jwt_payload, user_id=None):
+        expires = jwt_payload.get("exp")
+
+        db.session.merge(
+            RevokedToken(
+                jti=jwt_payload["jti"],
+                user_id=user_id,
+                token_type=jwt_payload["type"],
+                expires_at=datetime.fromtimestamp(expires) if expires else None,
+            )
+        )
+        db.session.commit()
+
+        self._add(jwt_payload["jti"])
+
+    def sync(self):
+        statement = select(RevokedToken.jti, RevokedToken.revoked_at)
+
+        # revoked_at is taken when the row is written, not when it commits,
+        # so a slow transaction can land behind rows already seen
+        if self._synced_until is not None:
+            since = self._synced_until - timedelta(seconds=self.sync_overlap)
+            statement = statement.where(RevokedToken.revoked_at >= since)
+
+        with db.engine.connect() as connection:
+            rows = connection.execute(statement).all()
+
+        with self._lock:
+            for jti, revoked_at in rows:
+                self._bloom.add(jti)
+                self._remember_locked(jti)
+
+                if self._synced_until is None or revoked_at > self._synced_until:
+                    self._synced_until = revoked_at
+
+            self._synced_at = time.monotonic()
+
+    def rebuild(self):
+        bloom = BloomFilter(self.bloom_size, self.bloom_hashes)
+
+        with db.engine.begin() as connection:
+            connection.execute(
+                delete(RevokedToken).where(RevokedToken.expires_at < datetime.now())
+            )
+            synced_until = connection.execute(
+                select(func.max(RevokedToken.revoked_at))
+            ).scalar()
+
+            for jti in connection.execute(select(RevokedToken.jti)).scalars():
+                bloom.add(jti)
+
+        with self._lock:
+            self._bloom = bloom
+            self._synced_until = synced_until
+            self._synced_at = self._rebuilt_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, recent=len(self._recent))
+
+    def _refresh(self):
+        if self._fresh():
+            return
+
+        # Until the first load nothing can be answered, so wait for it; later
+        # one request refreshes while the others go on with the old state
+        if not self._sync_lock.acquire(blocking=self._rebuilt_at is None):
+            return
+
+        try:
+            if self._fresh():
+                return
+
+            if (
+                self._rebuilt_at is None
+                or time.monotonic() - self._rebuilt_at >= self.rebuild_interval
+            ):
+                self.rebuild()
+            else:
+                self.sync()
+        finally:
+            self._sync_lock.release()
+
+    def _fresh(self):
+        return (
+            self._rebuilt_at is not None
+            and time.monotonic() - self._synced_at < self.sync_interval
+        )
+
+    def _add(self, jti):
+        with self._lock:
+            self._bloom.add(jti)
+            self._remember_locked(jti)
+
+    def _remember(self, jti):
+        with self._lock:
+            self._remember_locked(jti)
+
+    def _remember_locked(self, jti):
+        self._recent[jti] = None
+        self._recent.move_to_end(jti)
+
+        while len(self._recent) > self.recent_size:
+            self._recent.popitem(last=False)
+
+    def _reset_stats(self):
+        with self._lock:
+            self._stats = {"bloom_negatives": 0, "exact_hits": 0, "db_checks": 0}
+
+
+token_blocklist = TokenBlocklist()
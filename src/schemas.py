@@ -0,0 +1,100 @@
+from time import perf_counter
+import validators
+from jsonschema import Draft7Validator, FormatChecker
+from sqlalchemy import Float, Integer, String
+from src.database import Motorcycle
+from src.timing import record_timing
+
+# Filled in by the server, never accepted from clients
+SERVER_COLUMNS = ("short_url", "visits", "user_id", "created_at", "updated_at")
+
+MOTORCYCLE_PARAMETERS = [
+    column.key
+    for column in Motorcycle.__table__.columns
+    if column.key not in SERVER_COLUMNS
+]
+
+format_checker = FormatChecker()
+
+
+@format_checker.checks("url")
+def is_url(value):
+    return not isinstance(value, str) or bool(validators.url(value))
+
+
+def json_type(column):
+    if isinstance(column.type, Integer):
+        return "integer"
+
+    if isinstance(column.type, Float):
+        return "number"
+
+    return "string"
+
+
+def motorcycle_schema(partial=False):
+    properties = {}
+
+    for key in MOTORCYCLE_PARAMETERS:
+        column = Motorcycle.__table__.c[key]
+        properties[key] = {"type": json_type(column)}
+
+        # Longer values would be rejected by the database, or truncated
+        if isinstance(column.type, String) and column.type.length:
+            properties[key]["maxLength"] = column.type.length
+
+    properties["niv"]["minLength"] = 1
+    properties["url"]["format"] = "url"
+
+    # Keyword order is the order errors are reported in
+    schema = {"type": "object"}
+
+    if not partial:
+        schema["required"] = MOTORCYCLE_PARAMETERS
+
+    schema["additionalProperties"] = False
+    schema["properties"] = properties
+
+    return schema
+
+
+# Built once at import, then shared by every request
+CREATE_VALIDATOR = Draft7Validator(motorcycle_schema(), format_checker=format_checker)
+UPDATE_VALIDATOR = Draft7Validator(
+    motorcycle_schema(partial=True), format_checker=format_checker
+)
+
+
+def validate(validator, instance):
+    """Return the first problem with `instance` as an error message, or None."""
+    started = perf_counter()
+    error = next(validator.iter_errors(instance), None)
+    record_timing("validate", perf_counter() - started)
+
+    return describe(error) if error is not None else None
+
+
+def describe(error):
+    field = error.path[0] if error.path else None
+
+    match error.validator:
+        case "required":
+            missing = next(p for p in error.validator_value if p not in error.instance)
+            return f"Missing {missing} parameter"
+        case "additionalProperties":
+            key = next(k for k in error.instance if k not in error.schema["properties"])
+            return f"Invalid parameter - {key}"
+        case "format":
+            return "Invalid URL"
+        case "maxLength":
+            return (
+                f"Invalid value for {field} - at most {error.validator_value} "
+                "characters"
+            )
+        case "type" if field:
+            return f"Invalid value for {field} - expected {error.validator_value}"
+
+    if field:
+        return f"Invalid value for {field}"
+
+    return "Expected a JSON object"
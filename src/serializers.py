@@ -0,0 +1,76 @@
+from functools import lru_cache
+from operator import attrgetter
+from sqlalchemy.orm import load_only
+from src.database import Motorcycle
+
+# Response field name -> Motorcycle attribute, in response order
+FIELDS = {
+    ("visit_count" if column.key == "visits" else column.key): column.key
+    for column in Motorcycle.__table__.columns
+    if column.key != "user_id"
+}
+
+
+class InvalidField(ValueError):
+    pass
+
+
+class RowSerializer:
+    """Serializes motorcycles for a fixed set of fields.
+
+    The attribute lookups are compiled into a single `attrgetter`, so a row
+    is read in one pass and turned into either a tuple or a dict.
+    """
+
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self.attributes = tuple(FIELDS[field] for field in self.fields)
+        getter = attrgetter(*self.attributes)
+
+        # attrgetter returns a bare value instead of a tuple for one attribute
+        self.values = getter if len(self.attributes) > 1 else lambda m: (getter(m),)
+
+    @property
+    def columns(self):
+        return [getattr(Motorcycle, attribute) for attribute in self.attributes]
+
+    def to_dict(self, motorcycle):
+        return dict(zip(self.fields, self.values(motorcycle)))
+
+    def many(self, motorcycles):
+        fields, values = self.fields, self.values
+        return [dict(zip(fields, values(motorcycle))) for motorcycle in motorcycles]
+
+
+@lru_cache(maxsize=256)
+def serializer_for(fields):
+    return RowSerializer(fields)
+
+
+def parse_fields(value):
+    if value is None:
+        return tuple(FIELDS)
+
+    fields = tuple(dict.fromkeys(field.strip() for field in value.split(",")))
+
+    for field in fields:
+        if field not in FIELDS:
+            raise InvalidField(field)
+
+    return fields
+
+
+def project(query, fields):
+    if len(fields) == len(FIELDS):
+        return query
+
+    # Only the requested columns are selected (plus the niv primary key)
+    return query.options(load_only(*serializer_for(fields).columns))
+
+
+def motorcycle_to_dict(motorcycle, fields=tuple(FIELDS)):
+    return serializer_for(fields).to_dict(motorcycle)
+
+
+def motorcycles_to_dicts(motorcycles, fields=tuple(FIELDS)):
+    return serializer_for(fields).many(motorcycles)
@@ -0,0 +1,166 @@
+from collections import deque
+from threading import Lock
+import string
+from sqlalchemy import insert, select, update
+
+ALPHABET = string.digits + string.ascii_letters
+BASE = len(ALPHABET)
+
+# Sequence numbers go through a Feistel network over the smallest even
+# number of bits covering the keyspace. Values landing past the keyspace are
+# fed through again (cycle walking), which keeps it a permutation of
+# `range(62 ** length)`. An affine map can't stand in for it: the last
+# characters of `n * a + b (mod 62 ** length)` only depend on the last
+# characters of `n`, so consecutive codes would count up in their suffix.
+ROUND_KEYS = (0x5BD1E995, 0x27D4EB2F, 0x165667B1, 0x9E3779B9)
+MASK64 = (1 << 64) - 1
+
+SEQUENCE_ID = 1
+
+
+def capacity(length):
+    return BASE**length
+
+
+def encode(value, length):
+    chars = []
+
+    for _ in range(length):
+        value, remainder = divmod(value, BASE)
+        chars.append(ALPHABET[remainder])
+
+    return "".join(reversed(chars))
+
+
+def permute(n, length):
+    size = capacity(length)
+    half = (size.bit_length() + 1) // 2
+
+    while True:
+        n = feistel(n, half)
+
+        if n < size:
+            return n
+
+
+def feistel(value, half):
+    mask = (1 << half) - 1
+    left, right = value >> half, value & mask
+
+    for key in ROUND_KEYS:
+        left, right = right, left ^ (mix(right + key) & mask)
+
+    return (left << half) | right
+
+
+def mix(value):
+    # The 64-bit finalizer of MurmurHash3, so every input bit flips about
+    # half of the output bits
+    value = ((value ^ (value >> 33)) * 0xFF51AFD7ED558CCD) & MASK64
+    value = ((value ^ (value >> 33)) * 0xC4CEB9FE1A85EC53) & MASK64
+    return value ^ (value >> 33)
+
+
+class ShortCodeAllocator:
+    """Hands out unique short codes without querying the database per code.
+
+    Each process reserves a block of sequence numbers with a single UPDATE on
+    the `short_code_sequence` row and turns them into codes through a fixed
+    permutation of the base62 keyspace. Once every code of the current length
+    has been handed out the sequence moves on to codes one character longer.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.block_size = 500
+        self.min_length = 3
+        self._block = deque()
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.block_size = app.config.get("SHORT_URL_BLOCK_SIZE", 500)
+        self.min_length = app.config.get("SHORT_URL_LENGTH", 3)
+
+        with self._lock:
+            self._block.clear()
+
+        app.extensions["short_codes"] = self
+
+    def allocate(self):
+        with self._lock:
+            while not self._block:
+                self._block.extend(self._reserve(self.block_size))
+
+            return self._block.popleft()
+
+    def allocate_many(self, count):
+        codes = []
+
+        with self._lock:
+            while len(codes) < count:
+                while not self._block:
+                    self._block.extend(
+                        self._reserve(max(self.block_size, count - len(codes)))
+                    )
+
+                codes.append(self._block.popleft())
+
+        return codes
+
+    def _reserve(self, size):
+        sequence = self.db.metadata.tables["short_code_sequence"]
+        motorcycle = self.db.metadata.tables["motorcycle"]
+
+        # A separate transaction, so the reservation survives a rollback of
+        # the caller's session and is never handed out twice. On SQLite that
+        # means codes must be allocated before the session starts writing,
+        # or this transaction waits on the session's database lock.
+        with self.db.engine.begin() as connection:
+            # Bumping the counter first takes the write lock before reading it
+            reserved = connection.execute(
+                update(sequence)
+                .where(sequence.c.id == SEQUENCE_ID)
+                .values(next_value=sequence.c.next_value + size)
+            ).rowcount
+
+            if not reserved:
+                connection.execute(
+                    insert(sequence).values(
+                        id=SEQUENCE_ID, length=self.min_length, next_value=size
+                    )
+                )
+
+            length, end = connection.execute(
+                select(sequence.c.length, sequence.c.next_value).where(
+                    sequence.c.id == SEQUENCE_ID
+                )
+            ).one()
+            start = end - size
+
+            if start >= capacity(length):
+                length += 1
+                start, end = 0, size
+                connection.execute(
+                    update(sequence)
+                    .where(sequence.c.id == SEQUENCE_ID)
+                    .values(length=length, next_value=end)
+                )
+
+            end = min(end, capacity(length))
+            codes = [encode(permute(n, length), length) for n in range(start, end)]
+
+            # Codes created before the allocator existed were picked at
+            # random, and older releases used another permutation, so skip
+            # the few of them that land in this block.
+            taken = set()
+
+            for i in range(0, len(codes), 500):
+                taken.update(
+                    connection.execute(
+                        select(motorcycle.c.short_url).where(
+                            motorcycle.c.short_url.in_(codes[i : i + 500])
+                        )
+                    ).scalars()
+                )
+
+        return [code for code in codes if code not in taken]
@@ -0,0 +1,22 @@
+from flask import after_this_request, has_request_context, request
+
+
+def record_timing(name, seconds):
+    """Add `seconds` to the request's `Server-Timing: <name>;dur=<ms>` metric."""
+    if not has_request_context():
+        return
+
+    # Kept on the request rather than g, which outlives it when the app
+    # context was pushed by the caller (tests, CLI commands)
+    if not hasattr(request, "server_timing"):
+        request.server_timing = {}
+
+        @after_this_request
+        def add_server_timing(response):
+            response.headers["Server-Timing"] = ", ".join(
+                f"{metric};dur={total * 1000:.3f}"
+                for metric, total in request.server_timing.items()
+            )
+            return response
+
+    request.server_timing[name] = request.server_timing.get(name, 0.0) + seconds
@@ -0,0 +1,186 @@
+from collections import Counter
+from datetime import datetime, timezone
+from threading import Event, Lock, Thread
+import atexit
+from sqlalchemy import bindparam, update
+from sqlalchemy.dialects import postgresql, sqlite
+from src.database import db, Motorcycle, VisitBucket
+from src.leaderboard import leaderboard
+
+GRANULARITIES = ("hour", "day")
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE
+UPSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def bucket_start(moment, granularity):
+    if granularity == "day":
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def utcnow():
+    # Buckets are stored as naive UTC so DST changes never merge two hours
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def bucket_rows(hours):
+    """Roll (short_url, hour) counts up into hour and day VisitBucket rows."""
+    buckets = Counter()
+
+    for (short_url, hour), visits in hours.items():
+        for granularity in GRANULARITIES:
+            buckets[short_url, granularity, bucket_start(hour, granularity)] += visits
+
+    return [
+        {
+            "short_url": short_url,
+            "granularity": granularity,
+            "start": start,
+            "visits": visits,
+        }
+        for (short_url, granularity, start), visits in buckets.items()
+    ]
+
+
+def bucket_upsert():
+    table = VisitBucket.__table__
+    statement = UPSERTS[db.engine.dialect.name](table)
+
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.short_url, table.c.granularity, table.c.start],
+        set_={"visits": table.c.visits + statement.excluded.visits},
+    )
+
+
+class VisitCounter:
+    """Counts short-URL visits, either one UPDATE per visit or buffered in memory.
+
+    In buffered mode visits are aggregated per motorcycle and written as a
+    single batched `UPDATE ... SET visits = visits + :n` when the flush
+    interval elapses, the buffer reaches the flush threshold or the process
+    exits.
+
+    Visits are also counted per short URL and hour, and the same flush
+    upserts them into the hour and day rows of `visit_bucket` with one
+    batched statement.
+
+    Once written, visits are passed on to the leaderboard.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.buffered = False
+        self.flush_interval = 5
+        self.flush_threshold = 1000
+        self._pending = Counter()
+        self._hours = Counter()
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread = None
+        atexit.register(self.shutdown)
+
+    def init_app(self, app):
+        self.shutdown()
+
+        self.app = app
+        self.buffered = app.config.get("VISITS_BUFFERED", False)
+        self.flush_interval = app.config.get("VISITS_FLUSH_INTERVAL", 5)
+        self.flush_threshold = app.config.get("VISITS_FLUSH_THRESHOLD", 1000)
+        self._stop = Event()
+        app.extensions["visit_counter"] = self
+
+    def record(self, niv, short_url):
+        hour = bucket_start(utcnow(), "hour")
+
+        if not self.buffered:
+            db.session.execute(
+                update(Motorcycle)
+                .where(Motorcycle.niv == niv)
+                .values(visits=Motorcycle.visits + 1)
+            )
+            db.session.execute(bucket_upsert(), bucket_rows({(short_url, hour): 1}))
+            db.session.commit()
+            leaderboard.add({niv: 1})
+            return
+
+        with self._lock:
+            self._pending[niv] += 1
+            self._hours[short_url, hour] += 1
+            pending = self._pending.total()
+
+        self._start()
+
+        if pending >= self.flush_threshold:
+            self.flush()
+
+    def pending(self):
+        with self._lock:
+            return self._pending.total()
+
+    def flush(self):
+        with self._lock:
+            deltas, self._pending = self._pending, Counter()
+            hours, self._hours = self._hours, Counter()
+
+        if not deltas or self.app is None:
+            return 0
+
+        table = Motorcycle.__table__
+        statement = (
+            update(table)
+            .where(table.c.niv == bindparam("b_niv"))
+            .values(visits=table.c.visits + bindparam("b_visits"))
+        )
+
+        with self.app.app_context():
+            try:
+                db.session.execute(
+                    statement,
+                    [{"b_niv": niv, "b_visits": n} for niv, n in deltas.items()],
+                )
+                db.session.execute(bucket_upsert(), bucket_rows(hours))
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+
+                # Keep the deltas so the next flush retries them
+                with self._lock:
+                    self._pending.update(deltas)
+                    self._hours.update(hours)
+                raise
+
+        leaderboard.add(deltas)
+
+        return deltas.total()
+
+    def shutdown(self):
+        self._stop.set()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        self.flush()
+
+    def _start(self):
+        if self._thread is not None:
+            return
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = Thread(
+                    target=self._run, name="visit-counter-flush", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                self.app.logger.exception("Failed to flush buffered visits")
+
+
+visit_counter = VisitCounter()
@@ -1,8 +1,18 @@
 import unittest
 import os
+import tempfile
 from src.config.config import config_dict
 from src import create_app
-from src.database import db, Motorcycle, User
+from src.database import db, short_codes, Motorcycle, User, VisitBucket
+from src.shortcodes import ALPHABET, BASE, capacity, encode, permute
+from src.json_provider import ORJSONProvider
+from src.serializers import motorcycle_to_dict, serializer_for
+from src.schemas import CREATE_VALIDATOR, UPDATE_VALIDATOR, validate
+from datetime import datetime
+from src.cache import LRUCache, short_url_cache
+from src.visits import visit_counter
+from src.leaderboard import Leaderboard
+from src.ratelimit import TokenBucketStore
 
 
 class UserTestCase(unittest.TestCase):
@@ -171,3 +181,301 @@ class UserTestCase(unittest.TestCase):
         )
 
         self.assertEqual(response.status_code, 302)
+
+    def createMotorcycle_getToken(self):
+        self.client.post(
+            "/api/v1/auth/register",
+            json={
+                "username": "test",
+                "email": "testuser@test.com",
+                "password": "TestPassword123!",
+            },
+        )
+
+        response = self.client.post(
+            "/api/v1/auth/login",
+            json={
+                "email": "testuser@test.com",
+                "password": "TestPassword123!",
+            },
+        )
+
+        token = response.json["user"]["access"]
+
+        response = self.client.post(
+            "/api/v1/motorcycles/",
+            json={
+                "niv": "1HD1BWV1X7Y015039",
+                "brand": "Honda",
+                "model": "Cb500f",
+                "year": 2022,
+                "category": "Naked",
+                "rating": 3.3,
+                "displacement": 471,
+                "power": 46.9,
+                "torque": 43,
+                "engine_cylinders": "Twin",
+                "engine_stroke": "4-stroke",
+                "gearbox": "6-speed",
+                "bore": 67,
+                "stroke": 66.8,
+                "transmission_type": "Chain",
+                "front_brakes": "Single disc",
+                "rear_brakes": "Single disc",
+                "front_suspension": "Showa 41mm SFF-BP USD forks, pre-load adjustable",
+                "rear_suspension": "Prolink mono with 5 stage pre-load adjuster, steel hollow cross swingarm",
+                "front_tire": "120/70-ZR17",
+                "rear_tire": "190/50-ZR17",
+                "dry_weight": 192,
+                "wheelbase": 1410,
+                "fuel_capacity": 790,
+                "fuel_system": "Injection. PGM-FI with 34mm throttle bodies",
+                "fuel_control": "Double Overhead Cams/Twin Cam (DOHC)",
+                "seat_height": 16.7,
+                "cooling_system": "Liquid",
+                "color_options": "Grand Prix Red, Matt Axis Grey Metallic, Pearl Smokey Gray, Pearl Dusk Yellow",
+                "url": "https://www.motorcyclespecs.co.za/model/Honda/honda_cb500f_22.html",
+            },
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+        return token
+
+    def test_short_url_cache(self):
+        self.createMotorcycle_getToken()
+        short_url = Motorcycle.query.first().short_url
+
+        response = self.client.get("/" + short_url)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(short_url_cache.misses, 1)
+
+        response = self.client.get("/" + short_url)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(short_url_cache.hits, 1)
+        self.assertEqual(Motorcycle.query.first().visits, 2)
+
+    def test_short_url_cache_invalidated_on_update(self):
+        token = self.createMotorcycle_getToken()
+        short_url = Motorcycle.query.first().short_url
+
+        self.client.get("/" + short_url)
+
+        self.client.patch(
+            "/api/v1/motorcycles/1HD1BWV1X7Y015039",
+            json={
+                "url": "https://www.motorcyclespecs.co.za/model/Honda/honda_cb500f_21.html"
+            },
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+        response = self.client.get("/" + short_url)
+        self.assertEqual(
+            response.location,
+            "https://www.motorcyclespecs.co.za/model/Honda/honda_cb500f_21.html",
+        )
+
+    def test_short_url_cache_invalidated_on_delete(self):
+        token = self.createMotorcycle_getToken()
+        short_url = Motorcycle.query.first().short_url
+
+        self.client.get("/" + short_url)
+
+        self.client.delete(
+            "/api/v1/motorcycles/1HD1BWV1X7Y015039",
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+        response = self.client.get("/" + short_url)
+        self.assertEqual(response.status_code, 404)
+
+    def test_lru_cache_eviction_and_ttl(self):
+        cache = LRUCache(maxsize=2, ttl=0)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats()["size"], 2)
+
+        cache = LRUCache(maxsize=2, ttl=-1)
+        cache.set("a", 1)
+        self.assertIsNone(cache.get("a"))
+
+    def test_buffered_visits(self):
+        self.createMotorcycle_getToken()
+        short_url = Motorcycle.query.first().short_url
+
+        self.app.config.update(
+            VISITS_BUFFERED=True, VISITS_FLUSH_INTERVAL=3600, VISITS_FLUSH_THRESHOLD=3
+        )
+        visit_counter.init_app(self.app)
+
+        self.client.get("/" + short_url)
+        self.client.get("/" + short_url)
+
+        self.assertEqual(visit_counter.pending(), 2)
+        self.assertEqual(Motorcycle.query.first().visits, 0)
+
+        self.client.get("/" + short_url)
+
+        self.assertEqual(visit_counter.pending(), 0)
+        self.assertEqual(db.session.scalar(db.select(Motorcycle.visits)), 3)
+
+        self.client.get("/" + short_url)
+        visit_counter.shutdown()
+
+        self.assertEqual(db.session.scalar(db.select(Motorcycle.visits)), 4)
+
+        buckets = db.session.execute(
+            db.select(VisitBucket.granularity, VisitBucket.visits).where(
+                VisitBucket.short_url == short_url
+            )
+        ).all()
+        self.assertEqual(sorted(buckets), [("day", 4), ("hour", 4)])
+
+    def test_short_codes_are_a_permutation(self):
+        codes = {encode(permute(n, 2), 2) for n in range(capacity(2))}
+        self.assertEqual(len(codes), capacity(2))
+
+        codes = {encode(permute(n, 3), 3) for n in range(capacity(3))}
+        self.assertEqual(len(codes), capacity(3))
+
+    def test_short_codes_are_not_sequential(self):
+        codes = [encode(permute(n, 3), 3) for n in range(200)]
+        pairs = list(zip(codes, codes[1:]))
+
+        # Consecutive numbers must not just count up in the last character
+        steps = {
+            (ALPHABET.index(b[-1]) - ALPHABET.index(a[-1])) % BASE for a, b in pairs
+        }
+        self.assertGreater(len(steps), 40)
+        self.assertLess(sum(a[1:-1] == b[1:-1] for a, b in pairs), 20)
+
+    def test_short_codes_grow_when_keyspace_is_full(self):
+        self.app.config.update(SHORT_URL_LENGTH=1, SHORT_URL_BLOCK_SIZE=10)
+        short_codes.init_app(self.app)
+
+        codes = [short_codes.allocate() for _ in range(70)]
+
+        self.assertEqual(len(set(codes)), 70)
+        self.assertTrue(all(len(code) == 1 for code in codes[:62]))
+        self.assertTrue(all(len(code) == 2 for code in codes[62:]))
+        self.assertEqual(len(short_codes.allocate_many(25)), 25)
+
+    def test_fast_json_provider(self):
+        self.assertIsInstance(self.app.json, ORJSONProvider)
+
+        token = self.createMotorcycle_getToken()
+
+        response = self.client.get(
+            "/api/v1/motorcycles/1HD1BWV1X7Y015039",
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+        created_at = response.json["data"]["created_at"]
+        self.assertEqual(datetime.fromisoformat(created_at).isoformat(), created_at)
+
+        response = self.client.get("/apispec.json")
+        self.assertEqual(response.status_code, 200)
+
+    def test_row_serializer(self):
+        motorcycle = Motorcycle(niv="1", brand="Honda", short_url="abc", visits=3)
+
+        self.assertEqual(
+            motorcycle_to_dict(motorcycle, ("niv", "visit_count")),
+            {"niv": "1", "visit_count": 3},
+        )
+        self.assertEqual(serializer_for(("brand",)).values(motorcycle), ("Honda",))
+
+    def test_motorcycle_schema(self):
+        self.assertEqual(
+            CREATE_VALIDATOR.schema["properties"]["year"], {"type": "integer"}
+        )
+        self.assertEqual(
+            CREATE_VALIDATOR.schema["properties"]["power"], {"type": "number"}
+        )
+        self.assertNotIn("short_url", CREATE_VALIDATOR.schema["properties"])
+
+        self.assertEqual(validate(CREATE_VALIDATOR, []), "Expected a JSON object")
+        self.assertEqual(validate(CREATE_VALIDATOR, {}), "Missing niv parameter")
+        self.assertIsNone(validate(UPDATE_VALIDATOR, {"rating": 4, "power": 50.5}))
+        self.assertEqual(
+            validate(UPDATE_VALIDATOR, {"year": "2022"}),
+            "Invalid value for year - expected integer",
+        )
+        self.assertEqual(
+            validate(UPDATE_VALIDATOR, {"year": True}),
+            "Invalid value for year - expected integer",
+        )
+        self.assertEqual(
+            validate(UPDATE_VALIDATOR, {"short_url": "abc"}),
+            "Invalid parameter - short_url",
+        )
+        self.assertEqual(validate(UPDATE_VALIDATOR, {"url": "nope"}), "Invalid URL")
+        self.assertEqual(
+            validate(UPDATE_VALIDATOR, {"niv": "1" * 18}),
+            "Invalid value for niv - at most 17 characters",
+        )
+        self.assertIsNone(validate(UPDATE_VALIDATOR, {"brand": "B" * 50}))
+
+    def test_token_bucket(self):
+        path = os.path.join(tempfile.mkdtemp(), "buckets.sqlite3")
+        store = TokenBucketStore(path)
+
+        self.assertEqual(store.take("a", 2, 1, now=100), 0)
+        self.assertEqual(store.take("a", 2, 1, now=100), 0)
+        self.assertEqual(store.take("a", 2, 1, now=100), 1)
+        self.assertEqual(store.take("b", 2, 1, now=100), 0)
+        self.assertEqual(store.take("a", 2, 1, now=101), 0)
+
+        # Another worker opening the same file sees the same buckets
+        other = TokenBucketStore(path)
+        self.assertAlmostEqual(other.take("a", 2, 1, now=101.5), 0.5)
+
+        other.purge(before=101)
+        self.assertEqual(store.take("b", 2, 1, now=101), 0)
+        self.assertEqual(store.take("b", 2, 1, now=101), 0)
+
+    def test_leaderboard(self):
+        self.createMotorcycle_getToken()
+        motorcycle = Motorcycle.query.first()
+        specs = {
+            column.key: getattr(motorcycle, column.key)
+            for column in Motorcycle.__table__.columns
+            if column.key not in ("niv", "url", "short_url", "visits")
+        }
+        db.session.delete(motorcycle)
+
+        for niv, visits in [("a", 5), ("b", 3), ("c", 1), ("d", 0)]:
+            url = f"https://www.motorcyclespecs.co.za/{niv}.html"
+            db.session.add(Motorcycle(niv=niv, url=url, visits=visits, **specs))
+
+        db.session.commit()
+
+        board = Leaderboard()
+        board.size, board.candidates = 2, 3
+
+        self.assertEqual(board.top(), [("a", 5), ("b", 3)])
+
+        # c is promoted once it passes b
+        board.add({"c": 3})
+        self.assertEqual(board.top(), [("a", 5), ("c", 4)])
+
+        # d was never loaded, so its count is only a guess and it stays out
+        # of the top until a rebuild reads the real one
+        board.add({"d": 2})
+        self.assertEqual(board.top(), [("a", 5), ("c", 4)])
+
+        # A long tail of single visits can't push real counts out either
+        for i in range(500):
+            board.add({f"tail{i}": 1})
+
+        self.assertEqual(board.top(), [("a", 5), ("c", 4)])
+
+        board.discard("c")
+        self.assertEqual(board.top(), [("a", 5)])
+
+        board.rebuild()
+        self.assertEqual(board.top(), [("a", 5), ("b", 3)])
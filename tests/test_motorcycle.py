@@ -1,8 +1,17 @@
 import unittest
 import os
+import json
+import csv
+import io
+import tempfile
+from unittest import mock
+from sqlalchemy import event, text
 from src.config.config import config_dict
 from src import create_app
 from src.database import db, Motorcycle, User
+from src.bulk import BulkInsert
+from src.motorcyles import filter_motorcycles
+from src.indexes import check_indexes, missing_indexes
 
 
 class UserTestCase(unittest.TestCase):
@@ -82,6 +91,52 @@ class UserTestCase(unittest.TestCase):
 
         return response
 
+    def motorcycleSpecs(self, i, **overrides):
+        specs = dict(
+            niv=f"1HD1BWV1X7Y{i:06d}",
+            brand="Honda",
+            model="Cb500f",
+            year=2022,
+            category="Naked",
+            rating=3.3,
+            displacement=471,
+            power=46.9,
+            torque=43,
+            engine_cylinders="Twin",
+            engine_stroke="4-stroke",
+            gearbox="6-speed",
+            bore=67,
+            stroke=66.8,
+            transmission_type="Chain",
+            front_brakes="Single disc",
+            rear_brakes="Single disc",
+            front_suspension="Showa 41mm SFF-BP USD forks",
+            rear_suspension="Prolink mono",
+            front_tire="120/70-ZR17",
+            rear_tire="190/50-ZR17",
+            dry_weight=192,
+            wheelbase=1410,
+            fuel_capacity=790,
+            fuel_system="Injection",
+            fuel_control="DOHC",
+            seat_height=16.7,
+            cooling_system="Liquid",
+            color_options="Grand Prix Red",
+            url=f"https://www.motorcyclespecs.co.za/model/Honda/{i}.html",
+        )
+        specs.update(overrides)
+
+        return specs
+
+    def addMotorcycles(self, count, **overrides):
+        user = User.query.first()
+
+        for i in range(count):
+            specs = self.motorcycleSpecs(i, **overrides)
+            db.session.add(Motorcycle(user_id=user.id, **specs))
+
+        db.session.commit()
+
     def test_motorcycle_invalidURL(self):
         token = self.createUser_getToken()
 
@@ -455,11 +510,13 @@ class UserTestCase(unittest.TestCase):
         token = self.createUser_getToken()
 
         self.createMotorcycle()
+        self.addMotorcycles(1)
 
+        # Takes the URL of the motorcycle created first
         response = self.client.put(
-            "/api/v1/motorcycles/1HD1BWV1X7Y015039",
+            "/api/v1/motorcycles/1HD1BWV1X7Y000000",
             json={
-                "niv": "1HD1BWV1X7Y015039",
+                "niv": "1HD1BWV1X7Y000000",
                 "brand": "Honda",
                 "model": "Cb500f",
                 "year": 2021,
@@ -471,7 +528,7 @@ class UserTestCase(unittest.TestCase):
                 "engine_cylinders": "Twin",
                 "engine_stroke": "4-stroke",
                 "gearbox": "6-speed",
-                "boreee": 67,
+                "bore": 67,
                 "stroke": 66.8,
                 "transmission_type": "Chain",
                 "front_brakes": "Single disc",
@@ -493,6 +550,7 @@ class UserTestCase(unittest.TestCase):
         )
 
         self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json["error"], "URL already exists")
 
     def test_motorcycle_updateExistingMoto_withWrongNIV(self):
         token = self.createUser_getToken()
@@ -514,7 +572,7 @@ class UserTestCase(unittest.TestCase):
                 "engine_cylinders": "Twin",
                 "engine_stroke": "4-stroke",
                 "gearbox": "6-speed",
-                "boreee": 67,
+                "bore": 67,
                 "stroke": 66.8,
                 "transmission_type": "Chain",
                 "front_brakes": "Single disc",
@@ -572,3 +630,1069 @@ class UserTestCase(unittest.TestCase):
         )
 
         self.assertEqual(response.status_code, 200)
+
+    def test_motorcycle_statsPaginatedByVisits(self):
+        token = self.createUser_getToken()
+        self.addMotorcycles(5)
+
+        for i, motorcycle in enumerate(Motorcycle.query.order_by(Motorcycle.niv)):
+            motorcycle.visits = [3, 9, 1, 7, 5][i]
+
+        db.session.commit()
+
+        response = self.client.get(
+            "/api/v1/motorcycles/stats",
+            headers={"Authorization": f"Bearer {token}"},
+            query_string={"sort": "-visits", "per_page": 2, "page": 2},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [motorcycle["visits"] for motorcycle in response.json["data"]], [5, 3]
+        )
+        self.assertEqual(
+            set(response.json["data"][0]), {"visits", "url", "niv", "short_url"}
+        )
+        self.assertEqual(response.json["totals"], {"motorcycles": 5, "visits": 25})
+        self.assertEqual(response.json["meta"]["pages"], 3)
+        self.assertTrue(response.json["meta"]["has_next"])
+
+        response = self.client.get(
+            "/api/v1/motorcycles/stats",
+            headers={"Authorization": f"Bearer {token}"},
+            query_string={"sort": "brand"},
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_motorcycle_visitStats(self):
+        token = self.createUser_getToken()
+        self.addMotorcycles(1)
+        short_url = Motorcycle.query.first().short_url
+        headers = {"Authorization": f"Bearer {token}"}
+
+        for _ in range(3):
+            self.client.get("/" + short_url)
+
+        response = self.client.get(
+            f"/api/v1/motorcycles/stats/{short_url}", headers=headers
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json["data"]), 1)
+        self.assertEqual(response.json["data"][0]["visits"], 3)
+        self.assertEqual(response.json["meta"]["total"], 3)
+
+        response = self.client.get(
+            f"/api/v1/motorcycles/stats/{short_url}",
+            headers=headers,
+            query_string={"granularity": "day", "from": "2020-01-01T00:00:00+02:00"},
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(
+            f"/api/v1/motorcycles/stats/{short_url}",
+            headers=headers,
+            query_string={
+                "granularity": "day",
+                "from": "2020-01-01T00:00:00+02:00",
+                "to": "2020-01-31",
+            },
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["meta"]["from"], "2019-12-31T22:00:00")
+        self.assertEqual(response.json["data"], [])
+
+        response = self.client.get("/api/v1/motorcycles/stats/nope", headers=headers)
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_motorcycle_trending(self):
+        token = self.createUser_getToken()
+        headers = {"Authorization": f"Bearer {token}"}
+        self.addMotorcycles(3)
+        first, second, third = Motorcycle.query.order_by(Motorcycle.niv)
+
+        self.client.get("/" + second.short_url)
+
+        response = self.client.get("/api/v1/motorcycles/trending", headers=headers)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["data"][0]["niv"], second.niv)
+        self.assertEqual(response.json["data"][0]["visit_count"], 1)
+        self.assertEqual(len(response.json["data"]), 3)
+
+        # Visits after the first read update the ranking in place
+        for _ in range(2):
+            self.client.get("/" + third.short_url)
+
+        response = self.client.get(
+            "/api/v1/motorcycles/trending", headers=headers, query_string={"limit": 2}
+        )
+
+        self.assertEqual(
+            [motorcycle["niv"] for motorcycle in response.json["data"]],
+            [third.niv, second.niv],
+        )
+
+        self.client.delete(f"/api/v1/motorcycles/{third.niv}", headers=headers)
+        response = self.client.get(
+            "/api/v1/motorcycles/trending", headers=headers, query_string={"limit": 1}
+        )
+
+        self.assertEqual(response.json["data"][0]["niv"], second.niv)
+
+        response = self.client.get(
+            "/api/v1/motorcycles/trending", headers=headers, query_string={"limit": 11}
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_motorcycle_cursorPagination(self):
+        token = self.createUser_getToken()
+
+        self.addMotorcycles(5)
+
+        nivs = []
+        cursor = None
+
+        while True:
+            query_string = {"limit": 2}
+
+            if cursor:
+                query_string["cursor"] = cursor
+
+            response = self.client.get(
+                "/api/v1/motorcycles/",
+                headers={"Authorization": f"Bearer {token}"},
+                query_string=query_string,
+            )
+
+            self.assertEqual(response.status_code, 200)
+            nivs += [motorcycle["niv"] for motorcycle in response.json["data"]]
+            cursor = response.json["meta"]["next_cursor"]
+
+            if not response.json["meta"]["has_next"]:
+                break
+
+        self.assertEqual(nivs, sorted(nivs))
+        self.assertEqual(len(nivs), 5)
+
+    def test_motorcycle_cursorPagination_withFilters(self):
+        token = self.createUser_getToken()
+
+        self.addMotorcycles(3)
+        self.addMotorcycles(
+            1, niv="JYARN23E0FA000001", brand="Yamaha", url="https://y.com/1"
+        )
+
+        response = self.client.get(
+            "/api/v1/motorcycles/",
+            headers={"Authorization": f"Bearer {token}"},
+            query_string={"brand": "yamaha", "limit": 5},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json["data"]), 1)
+        self.assertFalse(response.json["meta"]["has_next"])
+        self.assertIsNone(response.json["meta"]["next_cursor"])
+
+    def test_motorcycle_cursorPagination_invalidCursor(self):
+        token = self.createUser_getToken()
+
+        response = self.client.get(
+            "/api/v1/motorcycles/",
+            headers={"Authorization": f"Bearer {token}"},
+            query_string={"cursor": "not-a-cursor"},
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_motorcycle_countNone(self):
+        token = self.createUser_getToken()
+
+        self.addMotorcycles(3)
+
+        response = self.client.get(
+            "/api/v1/motorcycles/",
+            headers={"Authorization": f"Bearer {token}"},
+            query_string={"count": "none", "per_page": 2},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json["data"]), 2)
+        self.assertTrue(response.json["meta"]["has_next"])
+        self.assertIsNone(response.json["meta"]["total_count"])
+
+    def test_motorcycle_countEstimate(self):
+        token = self.createUser_getToken()
+
+        self.addMotorcycles(3)
+
+        response = self.client.get(
+            "/api/v1/motorcycles/",
+            headers={"Authorization": f"Bearer {token}"},
+            query_string={"count": "estimate", "brand": "honda", "per_page": 2},
+        )
+
+        self.assertEqual(response.json["meta"]["total_count"], 3)
+        self.assertEqual(response.json["meta"]["pages"], 2)
+        self.assertTrue(response.json["meta"]["estimated"])
+
+        self.addMotorcycles(1, niv="1HD1BWV1X7Y999999", url="https://h.com/1")
+
+        response = self.client.get(
+            "/api/v1/motorcycles/",
+            headers={"Authorization": f"Bearer {token}"},
+            query_string={"count": "estimate", "brand": "HONDA", "per_page": 2},
+        )
+
+        # Served from the cached count until it goes stale
+        self.assertEqual(response.json["meta"]["total_count"], 3)
+
+    def test_motorcycle_invalidCount(self):
+        token = self.createUser_getToken()
+
+        response = self.client.get(
+            "/api/v1/motorcycles/",
+            headers={"Authorization": f"Bearer {token}"},
+            query_string={"count": "sometimes"},
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_motorcycle_sparseFields(self):
+        token = self.createUser_getToken()
+
+        self.createMotorcycle()
+
+        response = self.client.get(
+            "/api/v1/motorcycles/",
+            headers={"Authorization": f"Bearer {token}"},
+            query_string={"fields": "niv,brand,short_url,visit_count"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            set(response.json["data"][0]), {"niv", "brand", "short_url", "visit_count"}
+        )
+
+        response = self.client.get(
+            "/api/v1/motorcycles/1HD1BWV1X7Y015039",
+            headers={"Authorization": f"Bearer {token}"},
+            query_string={"fields": "model,year"},
+        )
+
+        self.assertEqual(response.json["data"], {"model": "Cb500f", "year": 2022})
+
+    def test_motorcycle_sparseFields_unknownField(self):
+        token = self.createUser_getToken()
+
+        self.createMotorcycle()
+
+        response = self.client.get(
+            "/api/v1/motorcycles/1HD1BWV1X7Y015039",
+            headers={"Authorization": f"Bearer {token}"},
+            query_string={"fields": "niv,user_id"},
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_motorcycle_exportNDJSON(self):
+        token = self.createUser_getToken()
+
+        self.addMotorcycles(3)
+        self.addMotorcycles(
+            1, niv="JYARN23E0FA000001", brand="Yamaha", url="https://y.com/1"
+        )
+
+        response = self.client.get(
+            "/api/v1/motorcycles/export",
+            headers={"Authorization": f"Bearer {token}"},
+            query_string={"brand": "honda"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+
+        lines = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual(len(lines), 3)
+        self.assertEqual({line["brand"] for line in lines}, {"Honda"})
+
+    def test_motorcycle_exportCSV(self):
+        token = self.createUser_getToken()
+
+        self.addMotorcycles(2)
+
+        response = self.client.get(
+            "/api/v1/motorcycles/export",
+            headers={"Authorization": f"Bearer {token}"},
+            query_string={"format": "csv", "fields": "niv,year"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data.decode().splitlines(),
+            ["niv,year", "1HD1BWV1X7Y000000,2022", "1HD1BWV1X7Y000001,2022"],
+        )
+
+    def test_motorcycle_exportInvalidFormat(self):
+        token = self.createUser_getToken()
+
+        response = self.client.get(
+            "/api/v1/motorcycles/export",
+            headers={"Authorization": f"Bearer {token}"},
+            query_string={"format": "xml"},
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_motorcycle_conditionalGet(self):
+        token = self.createUser_getToken()
+
+        self.createMotorcycle()
+
+        response = self.client.get(
+            "/api/v1/motorcycles/1HD1BWV1X7Y015039",
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+        etag = response.headers["ETag"]
+        self.assertNotIn("Last-Modified", response.headers)
+
+        response = self.client.get(
+            "/api/v1/motorcycles/1HD1BWV1X7Y015039",
+            headers={"Authorization": f"Bearer {token}", "If-None-Match": etag},
+        )
+
+        self.assertEqual(response.status_code, 304)
+
+        # A visit leaves updated_at alone but still changes the ETag
+        self.client.get("/" + Motorcycle.query.first().short_url)
+
+        response = self.client.get(
+            "/api/v1/motorcycles/1HD1BWV1X7Y015039",
+            headers={
+                "Authorization": f"Bearer {token}",
+                "If-None-Match": etag,
+                "If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT",
+            },
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["data"]["visit_count"], 1)
+        etag = response.headers["ETag"]
+
+        self.client.patch(
+            "/api/v1/motorcycles/1HD1BWV1X7Y015039",
+            json={"rating": 4.0},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+        response = self.client.get(
+            "/api/v1/motorcycles/1HD1BWV1X7Y015039",
+            headers={"Authorization": f"Bearer {token}", "If-None-Match": etag},
+        )
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_motorcycle_conditionalGet_collection(self):
+        token = self.createUser_getToken()
+
+        self.addMotorcycles(2)
+
+        response = self.client.get(
+            "/api/v1/motorcycles/",
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+        etag = response.headers["ETag"]
+
+        response = self.client.get(
+            "/api/v1/motorcycles/",
+            headers={"Authorization": f"Bearer {token}", "If-None-Match": etag},
+        )
+
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(
+            "/api/v1/motorcycles/",
+            headers={"Authorization": f"Bearer {token}", "If-None-Match": etag},
+            query_string={"page": 2, "per_page": 1},
+        )
+
+        self.assertEqual(response.status_code, 200)
+
+        self.addMotorcycles(1, niv="1HD1BWV1X7Y999999", url="https://h.com/1")
+
+        response = self.client.get(
+            "/api/v1/motorcycles/",
+            headers={"Authorization": f"Bearer {token}", "If-None-Match": etag},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers["ETag"]
+
+        self.client.delete(
+            "/api/v1/motorcycles/1HD1BWV1X7Y999999",
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+        response = self.client.get(
+            "/api/v1/motorcycles/",
+            headers={
+                "Authorization": f"Bearer {token}",
+                "If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT",
+            },
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["meta"]["total_count"], 2)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+    def test_motorcycle_exactCount_singleAggregate(self):
+        token = self.createUser_getToken()
+        self.addMotorcycles(3)
+
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", record)
+        self.addCleanup(event.remove, db.engine, "before_cursor_execute", record)
+
+        response = self.client.get(
+            "/api/v1/motorcycles/",
+            headers={"Authorization": f"Bearer {token}"},
+            query_string={"per_page": 2, "page": 2},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sum("count(" in s.lower() for s in statements), 1)
+        self.assertEqual(len(response.json["data"]), 1)
+        self.assertEqual(response.json["meta"]["total_count"], 3)
+        self.assertEqual(response.json["meta"]["pages"], 2)
+        self.assertFalse(response.json["meta"]["has_next"])
+        self.assertTrue(response.json["meta"]["has_prev"])
+
+    def test_motorcycle_conditionalGet_uncountedPages(self):
+        token = self.createUser_getToken()
+        headers = {"Authorization": f"Bearer {token}"}
+        self.addMotorcycles(3)
+
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", record)
+        self.addCleanup(event.remove, db.engine, "before_cursor_execute", record)
+
+        for query_string in [{"count": "none"}, {"limit": 2}]:
+            statements.clear()
+            response = self.client.get(
+                "/api/v1/motorcycles/", headers=headers, query_string=query_string
+            )
+
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(any("count(" in s.lower() for s in statements))
+
+            response = self.client.get(
+                "/api/v1/motorcycles/",
+                headers=dict(headers, **{"If-None-Match": response.headers["ETag"]}),
+                query_string=query_string,
+            )
+
+            self.assertEqual(response.status_code, 304)
+
+    def test_motorcycle_rangeFiltersAndSort(self):
+        token = self.createUser_getToken()
+
+        self.addMotorcycles(1, niv="A0000000000000001", power=40, url="https://a.com/1")
+        self.addMotorcycles(1, niv="A0000000000000002", power=95, url="https://a.com/2")
+        self.addMotorcycles(
+            1, niv="A0000000000000003", power=150, url="https://a.com/3"
+        )
+        self.addMotorcycles(1, niv="A0000000000000004", power=200, year=2010)
+
+        response = self.client.get(
+            "/api/v1/motorcycles/",
+            headers={"Authorization": f"Bearer {token}"},
+            query_string={"power_min": 50, "year_from": 2020, "sort": "-power"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [motorcycle["power"] for motorcycle in response.json["data"]], [150, 95]
+        )
+
+    def test_motorcycle_rangeFilters_invalidValue(self):
+        token = self.createUser_getToken()
+
+        response = self.client.get(
+            "/api/v1/motorcycles/",
+            headers={"Authorization": f"Bearer {token}"},
+            query_string={"dry_weight_max": "heavy"},
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(
+            "/api/v1/motorcycles/",
+            headers={"Authorization": f"Bearer {token}"},
+            query_string={"sort": "brand"},
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_motorcycle_integerRangeBounds(self):
+        statement = filter_motorcycles(
+            db.select(Motorcycle.niv),
+            {"year_from": "2019.5", "torque_max": "50.9", "power_min": "50.5"},
+        )
+        params = statement.compile().params.values()
+
+        # repr tells 2020 from 2020.0
+        self.assertEqual(sorted(map(repr, params)), ["2020", "50", "50.5"])
+
+    def test_motorcycle_caseInsensitiveLookups(self):
+        token = self.createUser_getToken()
+
+        self.createMotorcycle()
+
+        response = self.client.get(
+            "/api/v1/motorcycles/1hd1bwv1x7y015039",
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(
+            "/api/v1/motorcycles/",
+            headers={"Authorization": f"Bearer {token}"},
+            query_string={"brand": "HONDA", "category": "naked", "year": "2022"},
+        )
+
+        self.assertEqual(len(response.json["data"]), 1)
+
+    def test_motorcycle_lookupsUseIndexes(self):
+        plan = db.session.execute(
+            db.text(
+                "EXPLAIN QUERY PLAN SELECT niv FROM motorcycle "
+                "WHERE lower(niv) = lower(:niv)"
+            ),
+            {"niv": "1HD1BWV1X7Y015039"},
+        ).all()
+
+        self.assertIn("ix_motorcycle_niv_lower", plan[0][-1])
+
+    def test_motorcycle_invalidYear(self):
+        token = self.createUser_getToken()
+
+        response = self.client.get(
+            "/api/v1/motorcycles/",
+            headers={"Authorization": f"Bearer {token}"},
+            query_string={"year": "twenty"},
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_motorcycle_bulkInsert(self):
+        token = self.createUser_getToken()
+
+        self.addMotorcycles(1)
+        self.app.config["BULK_CHUNK_SIZE"] = 2
+
+        response = self.client.post(
+            "/api/v1/motorcycles/bulk",
+            headers={"Authorization": f"Bearer {token}"},
+            json=[
+                self.motorcycleSpecs(1),
+                self.motorcycleSpecs(2),
+                # Same NIV as a motorcycle already in the database
+                self.motorcycleSpecs(3, niv="1hd1bwv1x7y000000"),
+                # Same URL as an earlier item of the request
+                self.motorcycleSpecs(
+                    4, url="https://www.motorcyclespecs.co.za/model/Honda/1.html"
+                ),
+                self.motorcycleSpecs(5, url="not a url"),
+                self.motorcycleSpecs(6),
+            ],
+        )
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.json["created"], 3)
+        self.assertEqual(response.json["failed"], 3)
+        self.assertEqual(
+            [result["status"] for result in response.json["results"]],
+            [201, 201, 409, 409, 400, 201],
+        )
+        self.assertEqual(response.json["results"][2]["error"], "NIV already exists")
+        self.assertEqual(response.json["results"][3]["error"], "URL already exists")
+        self.assertEqual(Motorcycle.query.count(), 4)
+
+        motorcycle = Motorcycle.query.filter_by(niv="1HD1BWV1X7Y000006").one()
+        self.assertEqual(response.json["results"][5]["short_url"], motorcycle.short_url)
+        self.assertEqual(motorcycle.visits, 0)
+        self.assertIsNotNone(motorcycle.created_at)
+
+    def test_motorcycle_bulkInsert_tooLong(self):
+        token = self.createUser_getToken()
+
+        response = self.client.post(
+            "/api/v1/motorcycles/bulk",
+            headers={"Authorization": f"Bearer {token}"},
+            json=[self.motorcycleSpecs(1, brand="B" * 51), self.motorcycleSpecs(2)],
+        )
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(
+            response.json["results"][0]["error"],
+            "Invalid value for brand - at most 50 characters",
+        )
+        self.assertEqual(Motorcycle.query.count(), 1)
+
+    def test_motorcycle_bulkInsert_ndjson(self):
+        token = self.createUser_getToken()
+
+        body = "\n".join(
+            [
+                json.dumps(self.motorcycleSpecs(1)),
+                "",
+                "{not json",
+                json.dumps(self.motorcycleSpecs(2)),
+            ]
+        )
+
+        response = self.client.post(
+            "/api/v1/motorcycles/bulk",
+            headers={"Authorization": f"Bearer {token}"},
+            data=body,
+            content_type="application/x-ndjson",
+        )
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(
+            [result["status"] for result in response.json["results"]],
+            [201, 400, 201],
+        )
+        self.assertEqual(Motorcycle.query.count(), 2)
+
+    def test_motorcycle_bulkInsert_notAnArray(self):
+        token = self.createUser_getToken()
+
+        response = self.client.post(
+            "/api/v1/motorcycles/bulk",
+            headers={"Authorization": f"Bearer {token}"},
+            json=self.motorcycleSpecs(1),
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_motorcycle_bulkUpdate_byNIV(self):
+        token = self.createUser_getToken()
+
+        self.addMotorcycles(3)
+
+        response = self.client.patch(
+            "/api/v1/motorcycles/bulk",
+            headers={"Authorization": f"Bearer {token}"},
+            json={
+                "niv": ["1hd1bwv1x7y000000", "1HD1BWV1X7Y000002", "UNKNOWN"],
+                "set": {"rating": 4.5, "color_options": "Matte Black"},
+            },
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["updated"], 2)
+        self.assertEqual(
+            sorted(response.json["nivs"]), ["1HD1BWV1X7Y000000", "1HD1BWV1X7Y000002"]
+        )
+        self.assertEqual(response.json["missing"], ["UNKNOWN"])
+        self.assertEqual(
+            [m.rating for m in Motorcycle.query.order_by(Motorcycle.niv)],
+            [4.5, 3.3, 4.5],
+        )
+
+    def test_motorcycle_bulkUpdate_byFilter(self):
+        token = self.createUser_getToken()
+
+        self.addMotorcycles(2)
+        self.addMotorcycles(
+            1, niv="JYARN23E0FA000001", brand="Yamaha", url="https://y.com/1"
+        )
+
+        response = self.client.patch(
+            "/api/v1/motorcycles/bulk",
+            headers={"Authorization": f"Bearer {token}"},
+            json={"filter": {"brand": "HONDA", "year": 2022}, "set": {"year": 2023}},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["updated"], 2)
+        self.assertNotIn("missing", response.json)
+        self.assertEqual(Motorcycle.query.filter_by(year=2023).count(), 2)
+
+    def test_motorcycle_bulkUpdate_invalid(self):
+        token = self.createUser_getToken()
+
+        for body in [
+            {"niv": ["1HD1BWV1X7Y000000"], "set": {"url": "https://a.com"}},
+            {"niv": ["1HD1BWV1X7Y000000"], "set": {"unknown": 1}},
+            {"niv": ["1HD1BWV1X7Y000000"], "set": {}},
+            {"filter": {}, "set": {"rating": 1}},
+            {"filter": {"page": 1}, "set": {"rating": 1}},
+            {"filter": {"brand": ["x"]}, "set": {"rating": 1}},
+            {"filter": {"year": {"gte": 2000}}, "set": {"rating": 1}},
+            {"filter": {"brand": None}, "set": {"rating": 1}},
+            {"set": {"rating": 1}},
+        ]:
+            response = self.client.patch(
+                "/api/v1/motorcycles/bulk",
+                headers={"Authorization": f"Bearer {token}"},
+                json=body,
+            )
+
+            self.assertEqual(response.status_code, 400, body)
+
+    def test_motorcycle_bulkDelete(self):
+        token = self.createUser_getToken()
+
+        self.addMotorcycles(3)
+        motorcycle = Motorcycle.query.filter_by(niv="1HD1BWV1X7Y000001").one()
+        short_url = motorcycle.short_url
+
+        # Warm the redirect cache, the delete must evict the entry
+        self.client.get(f"/{short_url}")
+
+        response = self.client.delete(
+            "/api/v1/motorcycles/bulk",
+            headers={"Authorization": f"Bearer {token}"},
+            json={"niv": ["1HD1BWV1X7Y000001", "1HD1BWV1X7Y000009"]},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["deleted"], 1)
+        self.assertEqual(response.json["missing"], ["1HD1BWV1X7Y000009"])
+        self.assertEqual(Motorcycle.query.count(), 2)
+        self.assertEqual(self.client.get(f"/{short_url}").status_code, 404)
+
+        response = self.client.delete(
+            "/api/v1/motorcycles/bulk",
+            headers={"Authorization": f"Bearer {token}"},
+            json={"filter": {"brand": ["x"]}},
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Motorcycle.query.count(), 2)
+
+        # Numbers are read as the query string would carry them
+        response = self.client.delete(
+            "/api/v1/motorcycles/bulk",
+            headers={"Authorization": f"Bearer {token}"},
+            json={"filter": {"brand": "Honda", "year_to": 2022}},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["deleted"], 2)
+
+    def test_motorcycle_batchGet(self):
+        token = self.createUser_getToken()
+
+        self.addMotorcycles(3)
+
+        response = self.client.get(
+            "/api/v1/motorcycles/batch",
+            headers={"Authorization": f"Bearer {token}"},
+            query_string={
+                "niv": "1HD1BWV1X7Y000002,unknown,1hd1bwv1x7y000000,1HD1BWV1X7Y000002",
+                "fields": "niv,brand",
+            },
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json["data"],
+            [
+                {"niv": "1HD1BWV1X7Y000002", "brand": "Honda"},
+                {"niv": "1HD1BWV1X7Y000000", "brand": "Honda"},
+            ],
+        )
+        self.assertEqual(response.json["missing"], ["unknown"])
+
+        response = self.client.get(
+            "/api/v1/motorcycles/batch",
+            headers={
+                "Authorization": f"Bearer {token}",
+                "If-None-Match": response.headers["ETag"],
+            },
+            query_string={
+                "niv": "1HD1BWV1X7Y000002,unknown,1hd1bwv1x7y000000,1HD1BWV1X7Y000002",
+                "fields": "niv,brand",
+            },
+        )
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_motorcycle_batchGet_post(self):
+        token = self.createUser_getToken()
+
+        self.addMotorcycles(2)
+
+        response = self.client.post(
+            "/api/v1/motorcycles/batch",
+            headers={"Authorization": f"Bearer {token}"},
+            json={"niv": ["1HD1BWV1X7Y000001", "1HD1BWV1X7Y000000"]},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [m["niv"] for m in response.json["data"]],
+            ["1HD1BWV1X7Y000001", "1HD1BWV1X7Y000000"],
+        )
+        self.assertEqual(response.json["missing"], [])
+
+    def test_motorcycle_batchGet_invalid(self):
+        token = self.createUser_getToken()
+
+        for query_string in [{}, {"niv": ","}, {"niv": ",".join(map(str, range(101)))}]:
+            response = self.client.get(
+                "/api/v1/motorcycles/batch",
+                headers={"Authorization": f"Bearer {token}"},
+                query_string=query_string,
+            )
+
+            self.assertEqual(response.status_code, 400, query_string)
+
+        response = self.client.post(
+            "/api/v1/motorcycles/batch",
+            headers={"Authorization": f"Bearer {token}"},
+            json={"niv": "1HD1BWV1X7Y000001"},
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_motorcycle_schemaValidation(self):
+        token = self.createUser_getToken()
+
+        response = self.client.post(
+            "/api/v1/motorcycles/",
+            headers={"Authorization": f"Bearer {token}"},
+            json=self.motorcycleSpecs(1, displacement="471cc"),
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json["error"], "Invalid value for displacement - expected integer"
+        )
+        self.assertIn("validate;dur=", response.headers["Server-Timing"])
+        self.assertEqual(Motorcycle.query.count(), 0)
+
+        self.addMotorcycles(1)
+
+        response = self.client.patch(
+            "/api/v1/motorcycles/1HD1BWV1X7Y000000",
+            headers={"Authorization": f"Bearer {token}"},
+            json={"rating": "great"},
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Motorcycle.query.one().rating, 3.3)
+
+        response = self.client.patch(
+            "/api/v1/motorcycles/1HD1BWV1X7Y000000",
+            headers={"Authorization": f"Bearer {token}"},
+            json={"rating": 4},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Server-Timing", response.headers)
+
+    def test_motorcycle_bulkInsert_schemaValidation(self):
+        token = self.createUser_getToken()
+
+        response = self.client.post(
+            "/api/v1/motorcycles/bulk",
+            headers={"Authorization": f"Bearer {token}"},
+            json=[self.motorcycleSpecs(1), self.motorcycleSpecs(2, year=None)],
+        )
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(
+            response.json["results"][1]["error"],
+            "Invalid value for year - expected integer",
+        )
+        self.assertEqual(Motorcycle.query.count(), 1)
+
+    def test_motorcycle_uniqueConstraints(self):
+        token = self.createUser_getToken()
+
+        self.addMotorcycles(2)
+
+        response = self.client.post(
+            "/api/v1/motorcycles/",
+            headers={"Authorization": f"Bearer {token}"},
+            json=self.motorcycleSpecs(5, niv="1hd1bwv1x7y000001"),
+        )
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json["error"], "NIV already exists")
+
+        response = self.client.post(
+            "/api/v1/motorcycles/",
+            headers={"Authorization": f"Bearer {token}"},
+            json=self.motorcycleSpecs(
+                5, url="HTTPS://www.motorcyclespecs.co.za/model/Honda/1.html"
+            ),
+        )
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json["error"], "URL already exists")
+
+        response = self.client.patch(
+            "/api/v1/motorcycles/1HD1BWV1X7Y000000",
+            headers={"Authorization": f"Bearer {token}"},
+            json={"niv": "1HD1BWV1X7Y000001"},
+        )
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json["error"], "NIV already exists")
+
+        # Writing a motorcycle's own URL back is not a conflict
+        response = self.client.patch(
+            "/api/v1/motorcycles/1hd1bwv1x7y000000",
+            headers={"Authorization": f"Bearer {token}"},
+            json={
+                "url": "https://www.motorcyclespecs.co.za/model/Honda/0.html",
+                "rating": 4.1,
+            },
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["data"]["niv"], "1HD1BWV1X7Y000000")
+        self.assertEqual(Motorcycle.query.count(), 2)
+        self.assertEqual(Motorcycle.query.filter_by(rating=4.1).count(), 1)
+
+    def writeCatalog(self, name, lines):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, name)
+
+        with open(path, "w", newline="") as f:
+            f.writelines(lines)
+
+        return path
+
+    def test_motorcycle_importCSV(self):
+        self.createUser_getToken()
+        self.addMotorcycles(1)
+
+        specs = [self.motorcycleSpecs(i) for i in range(5)]
+        specs[2]["year"] = "unknown"
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=[*specs[0], "visit_count"])
+        writer.writeheader()
+        writer.writerows({**spec, "visit_count": 12} for spec in specs)
+        buffer.seek(0)
+        path = self.writeCatalog("catalog.csv", buffer.readlines())
+
+        result = self.app.test_cli_runner(mix_stderr=False).invoke(
+            args=["import-motorcycles", path, "--user", "test", "--chunk-size", "2"]
+        )
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("Imported 3 of 5 motorcycles", result.stdout)
+        self.assertIn("rows/s", result.stdout)
+        self.assertIn("Row 1: NIV already exists", result.stderr)
+        self.assertIn("Row 3: Invalid value for year - expected integer", result.stderr)
+        self.assertFalse(os.path.exists(f"{path}.checkpoint"))
+
+        motorcycle = Motorcycle.query.filter_by(niv="1HD1BWV1X7Y000004").one()
+        self.assertEqual((motorcycle.year, motorcycle.rating), (2022, 3.3))
+        self.assertEqual(motorcycle.visits, 0)
+
+    def test_motorcycle_importNDJSON_resumesFromCheckpoint(self):
+        self.createUser_getToken()
+
+        path = self.writeCatalog(
+            "catalog.ndjson",
+            [json.dumps(self.motorcycleSpecs(i)) + "\n" for i in range(5)],
+        )
+        insert_chunk = BulkInsert.insert_chunk
+        calls = []
+
+        def fail_on_second_chunk(bulk, chunk, offset=0):
+            calls.append(offset)
+
+            if len(calls) == 2:
+                raise RuntimeError("database went away")
+
+            return insert_chunk(bulk, chunk, offset)
+
+        runner = self.app.test_cli_runner()
+        args = ["import-motorcycles", path, "--user", "test", "--chunk-size", "2"]
+
+        with mock.patch.object(BulkInsert, "insert_chunk", fail_on_second_chunk):
+            result = runner.invoke(args=args)
+
+        self.assertIsInstance(result.exception, RuntimeError)
+        self.assertEqual(Motorcycle.query.count(), 2)
+        self.assertTrue(os.path.exists(f"{path}.checkpoint"))
+
+        result = runner.invoke(args=args)
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("Resuming after row 2", result.output)
+        self.assertIn("Imported 5 of 5 motorcycles", result.output)
+        self.assertEqual(Motorcycle.query.count(), 5)
+
+    def test_motorcycle_import_unknownColumn(self):
+        self.createUser_getToken()
+
+        path = self.writeCatalog("catalog.csv", ["niv,horsepower\n", "1,2\n"])
+
+        result = self.app.test_cli_runner().invoke(
+            args=["import-motorcycles", path, "--user", "test"]
+        )
+
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn("Unknown column - horsepower", result.output)
+
+    def test_motorcycle_createIndexes(self):
+        # A database created before the lower() unique indexes were added
+        db.session.execute(text("DROP INDEX ix_motorcycle_niv_lower"))
+        db.session.execute(text("DROP INDEX ix_motorcycle_url_lower"))
+        db.session.commit()
+
+        with self.assertLogs(self.app.logger, level="ERROR") as logs:
+            check_indexes(self.app)
+
+        self.assertIn(
+            "ix_motorcycle_niv_lower, ix_motorcycle_url_lower", logs.output[0]
+        )
+
+        runner = self.app.test_cli_runner()
+        result = runner.invoke(args=["create-indexes"])
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("Created ix_motorcycle_niv_lower", result.output)
+        self.assertIn("Created ix_motorcycle_url_lower", result.output)
+        self.assertEqual(missing_indexes(), [])
+
+        result = runner.invoke(args=["create-indexes"])
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("All indexes exist", result.output)
+
+    def test_motorcycle_createIndexes_duplicates(self):
+        self.createUser_getToken()
+        db.session.execute(text("DROP INDEX ix_motorcycle_url_lower"))
+        self.addMotorcycles(2, url="honda")
+
+        result = self.app.test_cli_runner().invoke(args=["create-indexes"])
+
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn("ix_motorcycle_url_lower can't be created", result.output)
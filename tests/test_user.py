@@ -1,7 +1,16 @@
 import unittest
+import os
+import tempfile
+from unittest import mock
 from src.config.config import config_dict
 from src import create_app
-from src.database import db, User
+from src.database import db, RevokedToken, User
+from src.hashing import password_hasher
+from src.cache import user_profile_cache
+from src.revocation import BloomFilter, token_blocklist
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token, decode_token
+from werkzeug.security import generate_password_hash
 
 
 class UserTestCase(unittest.TestCase):
@@ -346,3 +355,355 @@ class UserTestCase(unittest.TestCase):
         )
 
         self.assertEqual(response.status_code, 400)
+
+    def test_user_login_upgradesPasswordHash(self):
+        db.session.add(
+            User(
+                username="test",
+                email="testuser@test.com",
+                password=generate_password_hash("TestPassword123!", "pbkdf2:sha1:500"),
+            )
+        )
+        db.session.commit()
+
+        response = self.client.post(
+            "/api/v1/auth/login",
+            json={"email": "testuser@test.com", "password": "TestPassword123!"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("hash;dur=", response.headers["Server-Timing"])
+
+        user = User.query.filter_by(email="testuser@test.com").first()
+        self.assertTrue(user.password.startswith("pbkdf2:sha256:1000$"))
+        self.assertFalse(password_hasher.needs_rehash(user.password))
+        self.assertTrue(password_hasher.check(user.password, "TestPassword123!"))
+
+    def test_user_passwordHasher_processPool(self):
+        self.app.config.update(PASSWORD_HASH_WORKERS=1)
+        password_hasher.init_app(self.app)
+        self.addCleanup(password_hasher.shutdown)
+
+        pwhash = password_hasher.hash("TestPassword123!")
+
+        self.assertTrue(password_hasher.check(pwhash, "TestPassword123!"))
+        self.assertFalse(password_hasher.check(pwhash, "WrongPassword123!"))
+        self.assertEqual(password_hasher.stats()["calls"], 3)
+        self.assertEqual(password_hasher.stats()["queue_depth"], 0)
+
+    def test_user_passwordHasher_workerKilled(self):
+        self.app.config.update(PASSWORD_HASH_WORKERS=1)
+        password_hasher.init_app(self.app)
+        self.addCleanup(password_hasher.shutdown)
+
+        pwhash = password_hasher.hash("TestPassword123!")
+
+        for process in list(password_hasher._pool._processes.values()):
+            process.kill()
+            process.join()
+
+        self.assertTrue(password_hasher.check(pwhash, "TestPassword123!"))
+        self.assertTrue(password_hasher.check(pwhash, "TestPassword123!"))
+
+    def test_user_metrics(self):
+        token = self.registerAndLogin()
+
+        response = self.client.get(
+            "/api/v1/metrics", headers={"Authorization": f"Bearer {token}"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["password_hasher"]["calls"], 2)
+        self.assertIn("hits", response.json["short_url_cache"])
+        self.assertIn("bloom_negatives", response.json["token_blocklist"])
+
+    def test_user_passwordHasher_busy(self):
+        self.app.config.update(PASSWORD_HASH_QUEUE_SIZE=0, PASSWORD_HASH_TIMEOUT=0)
+        password_hasher.init_app(self.app)
+
+        response = self.client.post(
+            "/api/v1/auth/register",
+            json={
+                "username": "test",
+                "email": "testuser@test.com",
+                "password": "TestPassword123!",
+            },
+        )
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "1")
+        self.assertIsNone(User.query.first())
+
+    def registerAndLogin(self):
+        self.client.post(
+            "/api/v1/auth/register",
+            json={
+                "username": "test",
+                "email": "testuser@test.com",
+                "password": "TestPassword123!",
+            },
+        )
+
+        response = self.client.post(
+            "/api/v1/auth/login",
+            json={"email": "testuser@test.com", "password": "TestPassword123!"},
+        )
+
+        return response.json["user"]["access"]
+
+    def test_user_me_cachedProfile(self):
+        token = self.registerAndLogin()
+        headers = {"Authorization": f"Bearer {token}"}
+
+        self.client.get("/api/v1/auth/me", headers=headers)
+        response = self.client.get("/api/v1/auth/me", headers=headers)
+
+        self.assertEqual(response.json["user"]["username"], "test")
+        self.assertEqual(user_profile_cache.stats()["hits"], 1)
+
+        user = User.query.first()
+        user.email = "changed@test.com"
+        db.session.commit()
+
+        response = self.client.get("/api/v1/auth/me", headers=headers)
+
+        self.assertEqual(response.json["user"]["email"], "changed@test.com")
+
+    def test_user_me_profileClaims(self):
+        self.app.config["JWT_PROFILE_CLAIMS"] = True
+        token = self.registerAndLogin()
+        user_profile_cache.clear()
+
+        # Gone from the database, the token alone answers /me
+        db.session.execute(db.delete(User))
+        db.session.commit()
+
+        response = self.client.get(
+            "/api/v1/auth/me", headers={"Authorization": f"Bearer {token}"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json["user"], {"username": "test", "email": "testuser@test.com"}
+        )
+        self.assertEqual(user_profile_cache.stats()["misses"], 0)
+
+    def test_user_register_duplicateSkipsHashing(self):
+        self.registerAndLogin()
+
+        with mock.patch.object(password_hasher, "hash") as hash_password:
+            response = self.client.post(
+                "/api/v1/auth/register",
+                json={
+                    "username": "test",
+                    "email": "another@test.com",
+                    "password": "TestPassword123!",
+                },
+            )
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json["error"], "Username already in use")
+        hash_password.assert_not_called()
+
+    def test_user_register_raceMapsToConflict(self):
+        hash_password = password_hasher.hash
+
+        def register_concurrently(password):
+            # Another request takes the username after the duplicate check
+            db.session.add(User(username="test", email="other@test.com", password="x"))
+            db.session.commit()
+            return hash_password(password)
+
+        with mock.patch.object(password_hasher, "hash", register_concurrently):
+            response = self.client.post(
+                "/api/v1/auth/register",
+                json={
+                    "username": "test",
+                    "email": "testuser@test.com",
+                    "password": "TestPassword123!",
+                },
+            )
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json["error"], "Username already in use")
+        self.assertEqual(User.query.count(), 1)
+
+    def test_user_logout_revokesToken(self):
+        token = self.registerAndLogin()
+        headers = {"Authorization": f"Bearer {token}"}
+
+        response = self.client.get("/api/v1/auth/me", headers=headers)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(token_blocklist.stats()["db_checks"], 0)
+        self.assertEqual(token_blocklist.stats()["bloom_negatives"], 1)
+
+        response = self.client.post("/api/v1/auth/logout", headers=headers)
+
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get("/api/v1/auth/me", headers=headers)
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(token_blocklist.stats()["exact_hits"], 1)
+
+    def test_user_logout_refreshToken(self):
+        self.registerAndLogin()
+        response = self.client.post(
+            "/api/v1/auth/login",
+            json={"email": "testuser@test.com", "password": "TestPassword123!"},
+        )
+        headers = {"Authorization": f"Bearer {response.json['user']['refresh']}"}
+
+        self.client.post("/api/v1/auth/logout", headers=headers)
+        response = self.client.get("/api/v1/auth/token/refresh", headers=headers)
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_user_revocationsFromOtherWorkers(self):
+        token = self.registerAndLogin()
+        headers = {"Authorization": f"Bearer {token}"}
+        self.client.get("/api/v1/auth/me", headers=headers)
+
+        jti = decode_token(token)["jti"]
+
+        # Revoked by another process, this one only learns it on the next sync
+        db.session.add(
+            RevokedToken(jti=jti, token_type="access", revoked_at=datetime.now())
+        )
+        db.session.commit()
+        token_blocklist.sync_interval = 0
+
+        response = self.client.get("/api/v1/auth/me", headers=headers)
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_user_lateRevocationsFromOtherWorkers(self):
+        token = self.registerAndLogin()
+        headers = {"Authorization": f"Bearer {token}"}
+
+        other = self.client.post(
+            "/api/v1/auth/login",
+            json={"email": "testuser@test.com", "password": "TestPassword123!"},
+        ).json["user"]["access"]
+        self.client.post(
+            "/api/v1/auth/logout", headers={"Authorization": f"Bearer {other}"}
+        )
+        token_blocklist.sync_interval = 0
+        self.client.get("/api/v1/auth/me", headers=headers)
+
+        # Committed after the newest row already seen, but stamped earlier
+        revoked = db.session.scalar(db.select(RevokedToken.revoked_at))
+        db.session.add(
+            RevokedToken(
+                jti=decode_token(token)["jti"],
+                token_type="access",
+                revoked_at=revoked - timedelta(seconds=30),
+            )
+        )
+        db.session.commit()
+
+        response = self.client.get("/api/v1/auth/me", headers=headers)
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(size=1 << 16, hashes=5)
+        keys = [f"jti-{i}" for i in range(1000)]
+
+        for key in keys:
+            bloom.add(key)
+
+        self.assertTrue(all(key in bloom for key in keys))
+        false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+        self.assertLess(false_positives, 100)
+
+    def test_user_rateLimited(self):
+        token = self.registerAndLogin()
+        storage = tempfile.mkdtemp()
+        self.app.config.update(
+            RATELIMIT_ENABLED=True,
+            RATELIMIT_STORAGE=os.path.join(storage, "buckets.sqlite3"),
+            RATELIMIT_POLICIES={"auth": (2, 0.01)},
+        )
+        credentials = {"email": "testuser@test.com", "password": "wrong"}
+
+        for _ in range(2):
+            response = self.client.post("/api/v1/auth/login", json=credentials)
+            self.assertEqual(response.status_code, 401)
+
+        response = self.client.post("/api/v1/auth/login", json=credentials)
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["Retry-After"], "100")
+
+        # Other clients and signed in users have buckets of their own
+        response = self.client.post(
+            "/api/v1/auth/login",
+            json=credentials,
+            environ_base={"REMOTE_ADDR": "10.0.0.2"},
+        )
+        self.assertEqual(response.status_code, 401)
+
+        response = self.client.get(
+            "/api/v1/auth/me", headers={"Authorization": f"Bearer {token}"}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_user_rateLimitedPerUser(self):
+        self.registerAndLogin()
+        self.app.config.update(
+            RATELIMIT_ENABLED=True,
+            RATELIMIT_STORAGE=os.path.join(tempfile.mkdtemp(), "buckets.sqlite3"),
+            RATELIMIT_POLICIES={"auth": (2, 0.01)},
+        )
+        user_id = User.query.first().id
+        tokens = [create_access_token(identity=user_id) for _ in range(2)]
+
+        # Each new token for the same user draws from the same bucket
+        for token in tokens:
+            response = self.client.get(
+                "/api/v1/auth/me", headers={"Authorization": f"Bearer {token}"}
+            )
+            self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(
+            "/api/v1/auth/me", headers={"Authorization": f"Bearer {tokens[0]}"}
+        )
+        self.assertEqual(response.status_code, 429)
+
+        # Made-up tokens fall back to the client IP
+        for token in ["made-up", "other", "another"]:
+            response = self.client.get(
+                "/api/v1/auth/me",
+                headers={"Authorization": f"Bearer {token}"},
+                environ_base={"REMOTE_ADDR": "10.0.0.2"},
+            )
+
+        self.assertEqual(response.status_code, 429)
+
+    def test_user_rateLimitedPerEndpoint(self):
+        token = self.registerAndLogin()
+        self.app.config.update(
+            RATELIMIT_ENABLED=True,
+            RATELIMIT_STORAGE=os.path.join(tempfile.mkdtemp(), "buckets.sqlite3"),
+            RATELIMIT_POLICIES={"auth.login": (1, 0.01), "auth": (100, 1)},
+        )
+        credentials = {"email": "testuser@test.com", "password": "wrong"}
+
+        self.client.post("/api/v1/auth/login", json=credentials)
+
+        # Login is keyed by IP, so a made-up token doesn't open a new bucket
+        response = self.client.post(
+            "/api/v1/auth/login",
+            json=credentials,
+            headers={"Authorization": "Bearer made-up"},
+        )
+        self.assertEqual(response.status_code, 429)
+
+        # The rest of the blueprint has a policy of its own
+        for _ in range(5):
+            response = self.client.get(
+                "/api/v1/auth/me", headers={"Authorization": f"Bearer {token}"}
+            )
+            self.assertEqual(response.status_code, 200)